@@ -0,0 +1,167 @@
+"""Incrementally updated OHLCV series for the chart endpoints.
+
+A bar history only ever changes at its end: past bars are final and the
+last one may still be forming. Each (source, symbol) series is downloaded
+once; later loads ask the upstream only for bars since the last cached
+bar and replace the tail with them, so reopening a chart costs a
+one-or-two-bar request, or nothing while the market is closed.
+
+:class:`DailyBarCache` keeps daily bars from a start date on;
+:class:`IntradayBarCache` keeps a rolling window of intraday bars.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import _calendar as calendar
+
+
+class _BarCache:
+    """Thread-safe LRU of bar series keyed by ``(source, symbol)``.
+
+    A series is considered current for ``refresh_seconds`` while its market
+    is open, and until the next open once it has been refreshed after the
+    close. Concurrent loads of the same key are serialized, so the second
+    caller is served from what the first one fetched instead of repeating
+    the upstream request.
+    """
+
+    def __init__(self, maxsize=128, refresh_seconds=60):
+        self.maxsize = maxsize
+        self.refresh_seconds = refresh_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _fresh_until(self, session, now):
+        return now + max(self.refresh_seconds, calendar.seconds_until_open(session))
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def fetched_at(self, key):
+        """Epoch seconds of the last successful fetch for ``key`` (None if
+        uncached); a failed tail refresh leaves it unchanged."""
+        entry = self.get(key)
+        return entry.get('fetched_at') if entry else None
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) >= 4 * self.maxsize:
+                    # Drop idle locks so arbitrary symbols cannot grow this forever
+                    self._key_locks = {k: l for k, l in self._key_locks.items() if l.locked()}
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _refresh_tail(self, key, entry, fetch, session, now):
+        """Fetch bars since the last cached one and splice them in.
+
+        Returns the updated entry; if the fetch fails the cached bars are
+        kept and retried after ``refresh_seconds``.
+        """
+        try:
+            tail = fetch(entry['bars'][-1]['time']) or []
+        except Exception:
+            tail = None
+        if tail is None:
+            # Upstream hiccup: keep serving the cached bars, retry later
+            entry = dict(entry, fresh_until=now + self.refresh_seconds)
+        else:
+            first_new = tail[0]['time'] if tail else None
+            kept = [b for b in entry['bars'] if first_new is None or b['time'] < first_new]
+            entry = dict(entry, bars=kept + tail, fresh_until=self._fresh_until(session, now), fetched_at=now)
+        self._store(key, entry)
+        return entry
+
+
+class DailyBarCache(_BarCache):
+    """Daily bar series; bars are dicts whose ``time`` is a ``YYYY-MM-DD``
+    string, oldest first."""
+
+    def load(self, key, from_date, fetch, session=None):
+        """Bars on or after ``from_date`` for ``key``.
+
+        ``fetch(since)`` downloads bars dated ``since`` or later. Without a
+        cached series covering ``from_date`` the whole range is fetched;
+        otherwise only the tail since the last cached bar, which replaces
+        that (possibly partial) bar. If a tail refresh fails the cached
+        series is served as-is.
+        """
+        with self._key_lock(key):
+            return self._load(key, from_date, fetch, session)
+
+    def _load(self, key, from_date, fetch, session):
+        now = time.time()
+        entry = self.get(key)
+        if entry is None or entry['start'] > from_date or not entry['bars']:
+            bars = fetch(from_date) or []
+            if bars:
+                self._store(key, {
+                    'start': from_date,
+                    'bars': bars,
+                    'fresh_until': self._fresh_until(session, now),
+                    'fetched_at': now,
+                })
+            return bars
+
+        if now >= entry['fresh_until']:
+            entry = self._refresh_tail(key, entry, fetch, session, now)
+
+        return [b for b in entry['bars'] if b['time'] >= from_date]
+
+
+class IntradayBarCache(_BarCache):
+    """Rolling window of intraday bars; ``time`` is Unix seconds.
+
+    The window is measured back from the newest bar rather than from now,
+    so the last session stays available over weekends and holidays.
+    """
+
+    def __init__(self, maxsize=64, refresh_seconds=60, window_seconds=4 * 86400):
+        super().__init__(maxsize, refresh_seconds)
+        self.window_seconds = window_seconds
+
+    def load(self, key, fetch, session=None):
+        """Bars for ``key`` from the last ``window_seconds``.
+
+        ``fetch(since)`` downloads bars with ``time >= since``. The first
+        load fetches the whole window; later ones only the bars since the
+        newest cached one, which replaces that (still forming) bar.
+        """
+        with self._key_lock(key):
+            return self._load(key, fetch, session)
+
+    def _load(self, key, fetch, session):
+        now = time.time()
+        entry = self.get(key)
+        if entry is None or not entry['bars']:
+            bars = fetch(int(now) - self.window_seconds) or []
+            if bars:
+                self._store(key, {'bars': bars, 'fresh_until': self._fresh_until(session, now), 'fetched_at': now})
+            return bars
+
+        if now >= entry['fresh_until']:
+            entry = self._refresh_tail(key, entry, fetch, session, now)
+            cutoff = entry['bars'][-1]['time'] - self.window_seconds
+            if entry['bars'][0]['time'] < cutoff:
+                entry = dict(entry, bars=[b for b in entry['bars'] if b['time'] >= cutoff])
+                self._store(key, entry)
+
+        return entry['bars']
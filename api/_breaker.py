@@ -0,0 +1,143 @@
+"""Per-(source, symbol) circuit breakers for the quote/chart fallback chains.
+
+When EODHD answers 422/NA for a symbol or Yahoo keeps timing out, paying the
+same failing round trip on every refresh only delays the working source. A
+breaker opens after repeated transient failures (or at once for a definitive
+"no data" answer), the chain skips that source during the cooldown, then a
+single half-open probe decides whether to close it again or back off longer.
+"""
+import threading
+import time
+import urllib.error
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_definitive(exc):
+    """True for upstream answers that will not change on retry (4xx except 408/429)."""
+    return (
+        isinstance(exc, urllib.error.HTTPError)
+        and 400 <= exc.code < 500
+        and exc.code not in (408, 429)
+    )
+
+
+class SourceHealth:
+    """Thread-safe failure tracker keyed by ``(source, symbol)``.
+
+    ``failure_threshold`` transient failures within ``failure_window`` seconds
+    open the breaker for ``cooldown`` seconds. Each failed half-open probe
+    doubles the cooldown, capped at ``max_cooldown``.
+    """
+
+    def __init__(self, failure_threshold=3, failure_window=300, cooldown=60, max_cooldown=900):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        entry = self._state.get(key)
+        if entry is None:
+            entry = self._state[key] = {
+                'state': CLOSED,
+                'failures': 0,
+                'last_failure': 0.0,
+                'opened_at': 0.0,
+                'probe_at': 0.0,
+                'cooldown': self.cooldown,
+                'last_error': None,
+            }
+        return entry
+
+    def allow(self, source, symbol):
+        """Whether the chain should try ``source`` for ``symbol`` now.
+
+        Once an open breaker's cooldown has elapsed, exactly one caller is let
+        through as the half-open probe; others keep skipping until it reports.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._state.get((source, symbol))
+            if entry is None or entry['state'] == CLOSED:
+                return True
+            if entry['state'] == OPEN and now - entry['opened_at'] >= entry['cooldown']:
+                entry['state'] = HALF_OPEN
+                entry['probe_at'] = now
+                return True
+            if entry['state'] == HALF_OPEN and now - entry['probe_at'] >= entry['cooldown']:
+                # The previous probe never reported back (e.g. cut off by a deadline)
+                entry['probe_at'] = now
+                return True
+            return False
+
+    def record_success(self, source, symbol):
+        with self._lock:
+            self._state.pop((source, symbol), None)
+
+    def record_failure(self, source, symbol, error=None, definitive=False):
+        """Count a failure; ``definitive`` (e.g. 422 or NA) opens the breaker at once."""
+        now = time.time()
+        with self._lock:
+            entry = self._entry((source, symbol))
+            if now - entry['last_failure'] > self.failure_window:
+                entry['failures'] = 0
+            entry['failures'] += 1
+            entry['last_failure'] = now
+            entry['last_error'] = str(error) if error is not None else None
+
+            if entry['state'] == HALF_OPEN:
+                entry['cooldown'] = min(entry['cooldown'] * 2, self.max_cooldown)
+                entry['state'] = OPEN
+                entry['opened_at'] = now
+            elif definitive or entry['failures'] >= self.failure_threshold:
+                entry['state'] = OPEN
+                entry['opened_at'] = now
+
+    def snapshot(self, symbols=None):
+        """Diagnostics for breakers that are not closed, keyed ``source:symbol``."""
+        now = time.time()
+        wanted = set(symbols) if symbols is not None else None
+        out = {}
+        with self._lock:
+            for (source, symbol), entry in self._state.items():
+                if entry['state'] == CLOSED:
+                    continue
+                if wanted is not None and symbol not in wanted:
+                    continue
+                retry_in = max(0, entry['opened_at'] + entry['cooldown'] - now)
+                out[f'{source}:{symbol}'] = {
+                    'state': entry['state'],
+                    'failures': entry['failures'],
+                    'retry_in': round(retry_in, 1) if entry['state'] == OPEN else 0,
+                    'last_error': entry['last_error'],
+                }
+        return out
+
+    def call(self, source, symbol, fetch, *args, skipped=None):
+        """Call ``fetch(*args)`` for ``(source, symbol)`` through the breaker.
+
+        Returns ``(data, error)``. Both are None when the breaker is open and
+        the call was skipped (``source`` is appended to ``skipped``). An empty
+        result, such as EODHD's "NA" or an empty bar list, counts as a
+        definitive miss.
+        """
+        if not self.allow(source, symbol):
+            if skipped is not None:
+                skipped.append(source)
+            return None, None
+        try:
+            data = fetch(*args)
+        except Exception as e:
+            self.record_failure(source, symbol, e, definitive=is_definitive(e))
+            return None, e
+        if data:
+            self.record_success(source, symbol)
+        else:
+            self.record_failure(source, symbol, 'no data', definitive=True)
+        return data, None
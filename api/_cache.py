@@ -0,0 +1,89 @@
+"""In-process caches shared by the serverless endpoints.
+
+Module-level instances live as long as the (warm) function instance does, so
+everything here is best-effort: a cold start simply begins with empty caches.
+Files starting with an underscore are not exposed as Vercel routes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Background revalidation runs on its own small pool so it never competes
+# with a request's fan-out workers.
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and stale-while-revalidate.
+
+    Each entry is fresh for ``ttl`` seconds, then servable as stale for a
+    further ``stale`` seconds while a refresh runs in the background. Past
+    that it is dropped. The least recently used entry is evicted once
+    ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def get(self, key):
+        """Return ``(value, state)`` where state is 'fresh' or 'stale'.
+
+        Returns ``(None, None)`` for a miss or an entry past its stale window.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, None
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                del self._data[key]
+                return None, None
+            self._data.move_to_end(key)
+            return value, ('fresh' if now < expires_at else 'stale')
+
+    def set(self, key, value, ttl, stale=0):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (value, now + ttl, now + ttl + stale)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def revalidate(self, keys, loader):
+        """Refresh ``keys`` in the background with ``loader(keys)``.
+
+        Keys already being refreshed are skipped, so concurrent requests
+        serving the same stale entry trigger one upstream refresh. The loader
+        is responsible for calling :meth:`set` with whatever it resolved.
+        """
+        with self._lock:
+            keys = [k for k in keys if k not in self._refreshing]
+            self._refreshing.update(keys)
+        if not keys:
+            return None
+
+        def run():
+            try:
+                loader(keys)
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(keys)
+
+        return _refresh_pool.submit(run)
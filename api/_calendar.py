@@ -0,0 +1,241 @@
+"""Trading calendar for the sessions documented in TRADING-HOURS.md.
+
+Quotes for a closed market cannot change, so the quote cache keeps them
+until the next open and the endpoints stop calling upstreams over nights,
+weekends and (US) holidays. Sessions are defined in the exchange's own
+time zone and resolved with zoneinfo, so EST/EDT and GMT/BST switches are
+handled without hard-coded offsets.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+
+NEW_YORK = ZoneInfo('America/New_York')
+LONDON = ZoneInfo('Europe/London')
+
+# Keep treating a market as open this long after the close, so the closing
+# print/settlement that upstreams publish a few minutes late is still fetched.
+SETTLE_SECONDS = 15 * 60
+# Upper bound for CDN caching of closed-market responses (a weekend is ~48h)
+CLOSED_MAX_AGE_SECONDS = 12 * 3600
+
+# (weekday the window opens, open time, weekday it closes, close time);
+# weekday 0 = Monday ... 6 = Sunday, times in the session's time zone.
+Window = namedtuple('Window', ['open_day', 'open_time', 'close_day', 'close_time'])
+Session = namedtuple('Session', ['name', 'tz', 'windows', 'holidays'])
+
+
+def _weekday_windows(open_time, close_time, days=range(5)):
+    return tuple(Window(d, open_time, d, close_time) for d in days)
+
+
+SESSIONS = {
+    # CME metals/energy: Sun 18:00 - Fri 17:00 ET with a daily 17:00-18:00 break,
+    # i.e. one window per trading day opening the previous evening.
+    'cme': Session('cme', NEW_YORK, tuple(
+        Window((d - 1) % 7, dtime(18, 0), d, dtime(17, 0)) for d in range(5)
+    ), None),
+    # FX: continuous Sun 17:00 - Fri 17:00 ET
+    'fx': Session('fx', NEW_YORK, (Window(6, dtime(17, 0), 4, dtime(17, 0)),), None),
+    # US stocks/ETFs: regular session only (our quotes/5m bars do not cover pre/post)
+    'us_equity': Session('us_equity', NEW_YORK, _weekday_windows(dtime(9, 30), dtime(16, 0)), 'nyse'),
+    # LSE ETCs (NICK.L): 08:00 - 16:30 London time
+    'lse': Session('lse', LONDON, _weekday_windows(dtime(8, 0), dtime(16, 30)), None),
+    # Crypto trades 24/7
+    'crypto': None,
+}
+
+# Symbol suffix -> session, checked against the symbol then its Yahoo symbol
+SUFFIX_SESSIONS = [
+    ('=F', 'cme'),
+    ('.US', 'us_equity'),
+    ('.CC', 'crypto'),
+    ('.FOREX', 'fx'),
+    ('=X', 'fx'),
+    ('.L', 'lse'),
+    ('USDT', 'crypto'),
+]
+
+
+def infer_session(symbol, yahoo_symbol=None):
+    """Session name for a symbol from its suffix, or None if unknown.
+
+    Unknown symbols (HIBOR fixings, ``.INDX`` yields, ...) are treated as
+    always open so nothing is suppressed for them.
+    """
+    for candidate in (symbol, yahoo_symbol):
+        if not candidate:
+            continue
+        for suffix, session in SUFFIX_SESSIONS:
+            if candidate.upper().endswith(suffix):
+                return session
+    return None
+
+
+def _nth_weekday(year, month, weekday, n):
+    """The ``n``-th ``weekday`` of a month (``n`` = -1 for the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    """NYSE observance: Saturday holidays move to Friday, Sunday ones to Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    """Full-day NYSE closures for ``year`` (the list in TRADING-HOURS.md)."""
+    days = {
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),   # Presidents' Day
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),   # Independence Day
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    # New Year's Day falling on a Saturday is not observed on the prior Friday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    return days
+
+
+HOLIDAY_CALENDARS = {'nyse': nyse_holidays}
+
+
+def _is_holiday(session, day):
+    calendar = HOLIDAY_CALENDARS.get(session.holidays)
+    return calendar is not None and day in calendar(day.year)
+
+
+def _windows_around(session, now):
+    """``(open, close)`` UTC datetimes of the session windows near ``now``."""
+    local_today = now.astimezone(session.tz).date()
+    for offset in range(-7, 15):
+        day = local_today + timedelta(days=offset)
+        for window in session.windows:
+            if day.weekday() != window.open_day:
+                continue
+            close_day = day + timedelta(days=(window.close_day - window.open_day) % 7)
+            # A day session is skipped on its holiday; CME/FX have no holiday table
+            if _is_holiday(session, close_day):
+                continue
+            opens = datetime.combine(day, window.open_time, tzinfo=session.tz)
+            closes = datetime.combine(close_day, window.close_time, tzinfo=session.tz)
+            yield opens.astimezone(timezone.utc), closes.astimezone(timezone.utc)
+
+
+def _session(name):
+    return SESSIONS.get(name) if name else None
+
+
+def is_open(session_name, now=None):
+    """Whether prices for ``session_name`` can move at ``now`` (UTC-aware).
+
+    Unknown sessions and crypto are always open. The close is extended by
+    :data:`SETTLE_SECONDS`.
+    """
+    session = _session(session_name)
+    if session is None:
+        return True
+    now = now or datetime.now(timezone.utc)
+    settle = timedelta(seconds=SETTLE_SECONDS)
+    return any(opens <= now < closes + settle for opens, closes in _windows_around(session, now))
+
+
+def next_open(session_name, now=None):
+    """UTC datetime of the next session open after ``now`` (None if always open)."""
+    session = _session(session_name)
+    if session is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    upcoming = [opens for opens, _ in _windows_around(session, now) if opens > now]
+    return min(upcoming) if upcoming else None
+
+
+def next_close(session_name, now=None):
+    """UTC datetime when the current (or, if closed, the next) session ends,
+    including :data:`SETTLE_SECONDS`. None for always-open sessions."""
+    session = _session(session_name)
+    if session is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    settle = timedelta(seconds=SETTLE_SECONDS)
+    upcoming = [closes + settle for _, closes in _windows_around(session, now) if closes + settle > now]
+    return min(upcoming) if upcoming else None
+
+
+def trades_every_day(session_name):
+    """Whether the market prints a daily bar on weekends too (crypto)."""
+    return bool(session_name) and session_name in SESSIONS and SESSIONS[session_name] is None
+
+
+def session_bounds(session_name, at):
+    """``(open, close)`` UTC datetimes of the latest session window that
+    opened at or before ``at`` (close includes :data:`SETTLE_SECONDS`).
+
+    For a bar time this is the session the bar belongs to, or the one just
+    before it for pre/post-market bars. None for always-open sessions.
+    """
+    session = _session(session_name)
+    if session is None:
+        return None
+    settle = timedelta(seconds=SETTLE_SECONDS)
+    started = [(opens, closes + settle) for opens, closes in _windows_around(session, at) if opens <= at]
+    return max(started) if started else None
+
+
+def local_date(session_name, now=None):
+    """Today's date in the session's time zone (UTC for crypto/unknown)."""
+    session = _session(session_name)
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(session.tz if session else timezone.utc).date()
+
+
+def seconds_until_open(session_name, now=None):
+    """Seconds until the market reopens; 0 while it is open (or always open)."""
+    now = now or datetime.now(timezone.utc)
+    if is_open(session_name, now):
+        return 0
+    opens = next_open(session_name, now)
+    return max(0, int((opens - now).total_seconds())) if opens else 0
+
+
+def closed_max_age(session_names, default, now=None):
+    """``s-maxage`` for a response covering ``session_names``.
+
+    While every market involved is closed nothing can change before the
+    earliest reopen, so the response may be cached until then (capped at
+    :data:`CLOSED_MAX_AGE_SECONDS`). Otherwise ``default``.
+    """
+    now = now or datetime.now(timezone.utc)
+    closed_for = min((seconds_until_open(name, now) for name in session_names), default=0)
+    if closed_for <= default:
+        return default
+    return min(closed_for, CLOSED_MAX_AGE_SECONDS)
@@ -0,0 +1,408 @@
+"""Chart data loading shared by /api/chart and /api/charts.
+
+Per symbol: HIBOR tenors come from the shared HIBOR table; everything else
+tries EODHD (5m intraday or the cached daily series) and falls back to
+Yahoo, each source behind its own per-symbol circuit breaker. Daily ranges
+are slices of one canonical 2y series per symbol.
+"""
+import os
+import time
+import urllib.parse
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import _http as http_client
+import _columns as columns
+import _downsample as downsample
+import _calendar as calendar
+import _symbols as symbol_index
+import _hibor as hibor
+import _yahoo as yahoo
+import _resample as resample
+from _breaker import SourceHealth
+from _bars import DailyBarCache, IntradayBarCache
+
+
+EODHD_API_KEY = os.environ.get('EODHD_API_KEY', '')
+
+# Per-(source, symbol) breakers so a symbol EODHD keeps rejecting (or a Yahoo
+# path that keeps timing out) is skipped until a half-open probe succeeds.
+# Sources are split by interval (eodhd_intraday / eodhd_eod, yahoo_5m /
+# yahoo_1d ...), so a miss at one interval never skips another.
+SOURCE_HEALTH = SourceHealth()
+
+# Daily bars per (source, symbol), extended from the last cached date
+DAILY_BARS = DailyBarCache()
+# Rolling 4-day window of 5m bars per (source, symbol), extended from the last bar
+INTRADAY_BARS = IntradayBarCache()
+# ?session=current never spans more than a day (24/7 and FX markets)
+SESSION_MAX_SECONDS = 86400
+
+# Every daily range is the tail of one canonical series per symbol, so
+# switching range tabs never downloads overlapping history again.
+RANGE_TRADING_DAYS = {
+    '5d': 5,
+    '1w': 5,
+    '1mo': 21,
+    '1m': 21,
+    '3mo': 63,
+    '6mo': 126,
+    '1y': 252,
+    '2y': 504,
+}
+DEFAULT_RANGE_TRADING_DAYS = 63
+# Markets that trade all week (crypto) print a bar every calendar day
+RANGE_CALENDAR_DAYS = {
+    '5d': 5,
+    '1w': 7,
+    '1mo': 30,
+    '1m': 30,
+    '3mo': 91,
+    '6mo': 182,
+    '1y': 365,
+    '2y': 730,
+}
+DEFAULT_RANGE_CALENDAR_DAYS = 91
+CANONICAL_RANGE = '2y'
+
+
+# ─── EODHD helpers ───────────────────────────────────────────────
+
+def fetch_eodhd_intraday(symbol, since=None):
+    """Fetch intraday 5-minute bars from EODHD.
+
+    Uses 'from' param (unix timestamp ``since``, default the last ~2 days)
+    to keep the response small.
+    """
+    from_ts = int(since) if since is not None else int(time.time()) - 2 * 86400
+    url = (
+        f"https://eodhd.com/api/intraday/{urllib.parse.quote(symbol, safe='')}"
+        f"?api_token={EODHD_API_KEY}&interval=5m&fmt=json&from={from_ts}"
+    )
+    raw = http_client.get_json(url, timeout=10)
+
+    if not raw or not isinstance(raw, list):
+        return []
+
+    ohlcv = []
+    for bar in raw:
+        close = bar.get('close')
+        if close is None or close == 'NA':
+            continue
+        ohlcv.append({
+            'time': int(bar['timestamp']),
+            'open': float(bar.get('open') or close),
+            'high': float(bar.get('high') or close),
+            'low': float(bar.get('low') or close),
+            'close': float(close),
+            'volume': int(bar.get('volume') or 0)
+        })
+    return ohlcv
+
+
+def fetch_eodhd_eod(symbol, from_date):
+    """Fetch daily OHLCV bars from EODHD EOD API.
+    
+    Returns date strings (YYYY-MM-DD) as time values for BusinessDay format.
+    This eliminates timezone-related date offset issues in daily charts.
+    
+    Args:
+        symbol: EODHD symbol (e.g. GLD.US)
+        from_date: ISO date string YYYY-MM-DD
+    """
+    url = (
+        f"https://eodhd.com/api/eod/{urllib.parse.quote(symbol, safe='')}"
+        f"?api_token={EODHD_API_KEY}&fmt=json&from={from_date}"
+    )
+    raw = http_client.get_json(url, timeout=10)
+
+    if not raw or not isinstance(raw, list):
+        return []
+
+    ohlcv = []
+    for bar in raw:
+        close = bar.get('close')
+        if close is None or close == 'NA':
+            continue
+        date_str = bar.get('date', '')
+        if not date_str:
+            continue
+        # Validate date format
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            continue
+        ohlcv.append({
+            'time': date_str,
+            'open': float(bar.get('open') or close),
+            'high': float(bar.get('high') or close),
+            'low': float(bar.get('low') or close),
+            'close': float(close),
+            'volume': int(bar.get('volume') or 0)
+        })
+    return ohlcv
+
+
+def trading_days_for(range_val):
+    """Number of daily bars (trading days) shown for a range tab."""
+    return RANGE_TRADING_DAYS.get(range_val, DEFAULT_RANGE_TRADING_DAYS)
+
+
+def bars_for(range_val, session=None):
+    """Number of daily bars shown for a range tab in ``session``'s market:
+    trading days, or calendar days where the market trades every day."""
+    if calendar.trades_every_day(session):
+        return RANGE_CALENDAR_DAYS.get(range_val, DEFAULT_RANGE_CALENDAR_DAYS)
+    return trading_days_for(range_val)
+
+
+def range_to_from_date(range_val):
+    """Convert a range string to a 'from' date for EODHD EOD API.
+
+    Covers the range's calendar span (enough for 7-day crypto weeks too)
+    plus a holiday buffer.
+    """
+    calendar_days = RANGE_CALENDAR_DAYS.get(range_val, DEFAULT_RANGE_CALENDAR_DAYS) + 14
+    return (datetime.utcnow() - timedelta(days=calendar_days)).strftime('%Y-%m-%d')
+
+
+
+# ─── HKMA HIBOR helpers ─────────────────────────────────────────
+
+def fetch_hkma_hibor_chart(symbol, range_val):
+    """Fetch HKMA HIBOR fixing history as daily OHLC rows.
+
+    HIBOR is a rate fixing, not a traded instrument, so OHLC are all set to the
+    same daily fixing value. The frontend can still render it as a time series.
+    Served from the shared HIBOR table; when HKMA is unavailable that table is
+    HKAB's latest fixing, i.e. a single row.
+    """
+    return hibor.hibor_chart_rows(symbol, trading_days_for(range_val))
+
+# ─── Yahoo fallback ──────────────────────────────────────────────
+
+def fetch_yahoo_chart(symbol, range_val, interval, since=None):
+    """Fallback: fetch chart data from Yahoo Finance.
+    
+    For daily interval, returns date strings (YYYY-MM-DD) as time values.
+    For intraday interval, returns Unix timestamps.
+    ``since`` (YYYY-MM-DD, or Unix seconds for intraday) replaces
+    ``range_val`` with period1/period2 so only bars from then on are
+    downloaded.
+    """
+    if isinstance(since, int):
+        period1 = since
+        span = f"period1={period1}&period2={int(time.time())}"
+    elif since:
+        period1 = int(datetime.strptime(since, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+        span = f"period1={period1}&period2={int(time.time())}"
+    else:
+        span = f"range={range_val}"
+    yahoo_url = (
+        f"https://query2.finance.yahoo.com/v8/finance/chart/{urllib.parse.quote(symbol)}"
+        f"?{span}&interval={interval}"
+    )
+    # Cached crumb session; goes unauthenticated when no crumb is available
+    yahoo_data = yahoo.SESSION.get_json(yahoo_url, timeout=6)
+
+    chart_result = yahoo_data.get('chart', {}).get('result', [])
+    if not chart_result:
+        return []
+
+    # Yahoo daily timestamps are at market open/close; daily bars use the UTC date
+    return yahoo.normalize_chart(chart_result[0], date_strings=(interval == '1d'))
+
+
+# ─── Cached daily series ─────────────────────────────────────────
+
+def load_eodhd_daily(symbol, from_date, session=None):
+    """EODHD daily bars since ``from_date`` through :data:`DAILY_BARS`."""
+    return DAILY_BARS.load(('eodhd_eod', symbol), from_date,
+                           lambda since: fetch_eodhd_eod(symbol, since), session)
+
+
+def load_yahoo_daily(symbol, range_val, session=None):
+    """Yahoo daily bars for ``range_val`` through :data:`DAILY_BARS`.
+
+    The first load uses Yahoo's ``range``; later ones only fetch the tail.
+    """
+    from_date = range_to_from_date(range_val)
+
+    def fetch(since):
+        if since == from_date:
+            return fetch_yahoo_chart(symbol, range_val, '1d')
+        return fetch_yahoo_chart(symbol, range_val, '1d', since=since)
+
+    return DAILY_BARS.load(('yahoo', symbol), from_date, fetch, session)
+
+
+def load_eodhd_intraday(symbol, session=None):
+    """EODHD 5m bars of the rolling window through :data:`INTRADAY_BARS`."""
+    return INTRADAY_BARS.load(('eodhd_intraday', symbol),
+                              lambda since: fetch_eodhd_intraday(symbol, since), session)
+
+
+def load_yahoo_intraday(symbol, session=None):
+    """Yahoo 5m bars of the rolling window through :data:`INTRADAY_BARS`."""
+    return INTRADAY_BARS.load(('yahoo_5m', symbol),
+                              lambda since: fetch_yahoo_chart(symbol, None, '5m', since=since), session)
+
+
+def last_session(bars, session):
+    """Intraday ``bars`` of the session holding the newest bar: the current
+    session while it trades, the last one after the close. 24/7 markets
+    (and FX's week-long window) get the last 24 hours."""
+    if not bars:
+        return bars
+    newest = bars[-1]['time']
+    start, end = None, newest
+    bounds = calendar.session_bounds(session, datetime.fromtimestamp(newest, timezone.utc))
+    if bounds is not None:
+        start, end = bounds[0].timestamp(), min(newest, bounds[1].timestamp())
+    if start is None or end - start > SESSION_MAX_SECONDS:
+        start = end - SESSION_MAX_SECONDS
+    return [b for b in bars if start <= b['time'] <= end]
+
+
+# ─── Loading ─────────────────────────────────────────────────────
+
+# fetched_at: epoch seconds the bars were (last successfully) downloaded
+Chart = namedtuple('Chart', ['symbol', 'data', 'source', 'time_format', 'session', 'errors', 'fetched_at'],
+                   defaults=(None,))
+# How bars are shaped for the response: max_points/mode downsampling, format
+View = namedtuple('View', ['max_points', 'mode', 'format', 'session_only'])
+
+
+def _failure(source, error, skipped):
+    if source in skipped:
+        return f"{source}: skipped (breaker open)"
+    if error is not None:
+        return f"{source}: {type(error).__name__}: {error}"
+    return f"{source}: no data"
+
+
+def load_chart(symbol, range_val='3mo', interval='1d', yahoo_symbol=None):
+    """Bars for one symbol from the first source that has them.
+
+    Returns a :class:`Chart`; ``data`` is empty when every source failed
+    (or was skipped by its breaker), with the failures in ``errors``.
+    Derived intervals (1wk, 1mo, 15m, 1h) are resampled from the cached
+    1d / 5m bars.
+    """
+    requested_interval = interval
+    interval = resample.base_interval(interval)
+    ohlcv = []
+    # (bar cache, key) the bars came from, for their fetch time
+    cached_in = None
+    source_used = 'none'
+    errors = []
+    skipped = []
+    session = symbol_index.session_for(symbol, yahoo_symbol or None)
+
+    # ── HKMA HIBOR synthetic symbols ──
+    if symbol.startswith('HIBOR'):
+        try:
+            ohlcv = fetch_hkma_hibor_chart(symbol, range_val)
+            source_used = 'hkma_hibor_or_hkab_fallback'
+        except Exception as e:
+            errors.append(_failure('hkma_hibor', e, skipped))
+            ohlcv = []
+
+    # ── Try EODHD first (skipped while its breaker is open) ──
+    if not ohlcv and EODHD_API_KEY:
+        if interval == '5m':
+            ohlcv, err = SOURCE_HEALTH.call('eodhd_intraday', symbol, load_eodhd_intraday, symbol, session,
+                                            skipped=skipped)
+            source_used = 'eodhd_intraday'
+            cached_in = (INTRADAY_BARS, ('eodhd_intraday', symbol))
+        else:
+            from_date = range_to_from_date(CANONICAL_RANGE)
+            ohlcv, err = SOURCE_HEALTH.call('eodhd_eod', symbol, load_eodhd_daily, symbol, from_date, session,
+                                            skipped=skipped)
+            source_used = 'eodhd_eod'
+            cached_in = (DAILY_BARS, ('eodhd_eod', symbol))
+        if not ohlcv:
+            errors.append(_failure(source_used, err, skipped))
+        ohlcv = ohlcv or []
+
+    # ── Fallback to Yahoo ──
+    if not ohlcv:
+        fallback_sym = yahoo_symbol or symbol
+        # No 5m bars outside the session must not skip the daily chart
+        breaker = f'yahoo_{interval}'
+        if interval == '1d':
+            ohlcv, err = SOURCE_HEALTH.call(breaker, symbol, load_yahoo_daily,
+                                            fallback_sym, CANONICAL_RANGE, session, skipped=skipped)
+            cached_in = (DAILY_BARS, ('yahoo', fallback_sym))
+        elif interval == '5m':
+            ohlcv, err = SOURCE_HEALTH.call(breaker, symbol, load_yahoo_intraday,
+                                            fallback_sym, session, skipped=skipped)
+            cached_in = (INTRADAY_BARS, ('yahoo_5m', fallback_sym))
+        else:
+            ohlcv, err = SOURCE_HEALTH.call(breaker, symbol, fetch_yahoo_chart,
+                                            fallback_sym, range_val, interval, skipped=skipped)
+            cached_in = None
+        if not ohlcv:
+            errors.append(_failure(breaker, err, skipped))
+        ohlcv = ohlcv or []
+        source_used = 'yahoo'
+
+    # Daily ranges are slices of the canonical series
+    if interval == '1d':
+        ohlcv = ohlcv[-bars_for(range_val, session):]
+    ohlcv = resample.resample(ohlcv, requested_interval, session)
+
+    fetched_at = None
+    if ohlcv:
+        fetched_at = cached_in[0].fetched_at(cached_in[1]) if cached_in else time.time()
+
+    # Daily data uses date strings, intraday uses Unix timestamps
+    time_format = 'date' if interval == '1d' else 'timestamp'
+    return Chart(symbol, ohlcv, source_used, time_format, session, errors, fetched_at)
+
+
+def settled(chart, now=None):
+    """Whether ``chart``'s bars were downloaded after its market's latest
+    session closed (settle window included), i.e. they are final until the
+    next open. Cached bars served after a failed tail refresh are not."""
+    if not chart.fetched_at:
+        return False
+    bounds = calendar.session_bounds(chart.session, now or datetime.now(timezone.utc))
+    return bounds is not None and chart.fetched_at >= bounds[1].timestamp()
+
+
+def parse_view(params):
+    """:class:`View` from query params; ValueError with a client message."""
+    mode = params.get('mode', ['candle'])[0]
+    if mode not in downsample.MODES:
+        raise ValueError(f"mode must be one of {', '.join(downsample.MODES)}")
+    fmt = params.get('format', ['json'])[0]
+    if fmt not in columns.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(columns.FORMATS)}")
+    max_points = 0
+    if params.get('max_points', [''])[0]:
+        try:
+            max_points = int(params['max_points'][0])
+        except ValueError:
+            max_points = 0
+        if max_points < downsample.MIN_POINTS:
+            raise ValueError(f'max_points must be at least {downsample.MIN_POINTS}')
+    session = params.get('session', [''])[0]
+    if session not in ('', 'current'):
+        raise ValueError('session must be current')
+    return View(max_points, mode, fmt, session == 'current')
+
+
+def apply_view(chart, view):
+    """Shape ``chart.data`` for ``view``; returns ``(bars, downsampled_info)``.
+
+    ``session_only`` keeps the current/last session of intraday charts.
+    """
+    ohlcv = chart.data
+    if view.session_only and chart.time_format == 'timestamp':
+        ohlcv = last_session(ohlcv, chart.session)
+    total_points = len(ohlcv)
+    if not view.max_points or total_points <= view.max_points:
+        return ohlcv, None
+    ohlcv = downsample.downsample(ohlcv, view.max_points, view.mode)
+    return ohlcv, {'mode': view.mode, 'from': total_points}
@@ -0,0 +1,68 @@
+"""Compact encodings of OHLCV bar lists for the chart endpoints.
+
+The default payload is a list of ``{'time','open','high','low','close',
+'volume'}`` dicts, which repeats six keys per bar. Two opt-in formats:
+
+- ``columnar``: one JSON array per field (``data.time``, ``data.open``, ...).
+- ``f32``: the columns packed back to back as little-endian binary, ``time``
+  as int32 Unix seconds (daily ``YYYY-MM-DD`` dates become UTC midnight) and
+  the other fields as float32, so a client can wrap each slice in an
+  ``Int32Array`` / ``Float32Array`` without parsing. Sent base64-encoded in
+  the JSON envelope, or as raw ``application/octet-stream`` with
+  ``binary=1``. float32 keeps ~7 significant digits, plenty for drawing.
+"""
+import base64
+import calendar
+import sys
+from array import array
+
+FORMATS = ('json', 'columnar', 'f32')
+FIELDS = ('time', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {'time': 'int32', 'open': 'float32', 'high': 'float32', 'low': 'float32',
+          'close': 'float32', 'volume': 'float32'}
+
+
+def to_columns(bars):
+    """``{field: [values...]}`` for ``bars``."""
+    return {field: [b.get(field, 0) for b in bars] for field in FIELDS}
+
+
+def _unix_seconds(value):
+    if isinstance(value, str):
+        year, month, day = (int(part) for part in value[:10].split('-'))
+        return calendar.timegm((year, month, day, 0, 0, 0))
+    return int(value)
+
+
+def pack_f32(bars):
+    """Columns of ``bars`` as one little-endian int32/float32 buffer."""
+    columns = [array('i', (_unix_seconds(b['time']) for b in bars))]
+    for field in FIELDS[1:]:
+        columns.append(array('f', (float(b.get(field) or 0) for b in bars)))
+    if sys.byteorder == 'big':
+        for column in columns:
+            column.byteswap()
+    return b''.join(column.tobytes() for column in columns)
+
+
+def layout(length):
+    """Field order, dtypes and byte offsets of a :func:`pack_f32` buffer."""
+    return {
+        'length': length,
+        'fields': list(FIELDS),
+        'dtypes': DTYPES,
+        'offsets': {field: i * 4 * length for i, field in enumerate(FIELDS)},
+    }
+
+
+def encode(payload, fmt):
+    """Re-encode ``payload['data']`` in place for ``fmt`` and return the payload."""
+    if fmt == 'columnar':
+        payload['data'] = to_columns(payload['data'])
+        payload['format'] = fmt
+    elif fmt == 'f32':
+        bars = payload['data']
+        payload['data'] = base64.b64encode(pack_f32(bars)).decode('ascii')
+        payload['format'] = fmt
+        payload['layout'] = layout(len(bars))
+    return payload
@@ -0,0 +1,81 @@
+"""Server-side reduction of OHLCV series for small screens.
+
+A 2y daily or multi-day 5m series is far more bars than a phone chart has
+pixels. Two reducers, both single O(n) passes over the bar list:
+
+- :func:`lttb` (line charts) keeps original bars chosen by
+  Largest-Triangle-Three-Buckets on the close, which preserves the visual
+  shape (peaks and troughs) of the line.
+- :func:`bucket_ohlc` (candles) merges runs of consecutive bars into one
+  candle each: first open, highest high, lowest low, last close, summed
+  volume, stamped with the first bar's time.
+
+Bars are spaced by index rather than timestamp, matching how the charts
+lay out trading days (no gaps for weekends or overnight).
+"""
+
+MODES = ('candle', 'line')
+# LTTB always keeps the first and last bar plus at least one in between
+MIN_POINTS = 3
+
+
+def _bounds(size, buckets):
+    """Start indices of ``buckets`` contiguous, near-equal runs over ``size`` bars."""
+    return [size * k // buckets for k in range(buckets + 1)]
+
+
+def merge(run):
+    """One candle from consecutive ``run`` bars, stamped with the first's time."""
+    return {
+        'time': run[0]['time'],
+        'open': run[0]['open'],
+        'high': max(b['high'] for b in run),
+        'low': min(b['low'] for b in run),
+        'close': run[-1]['close'],
+        'volume': sum(b.get('volume') or 0 for b in run),
+    }
+
+
+def bucket_ohlc(bars, max_points):
+    """Merge ``bars`` into at most ``max_points`` candles."""
+    size = len(bars)
+    if size <= max_points:
+        return bars
+    bounds = _bounds(size, max_points)
+    return [merge(bars[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+
+def lttb(bars, max_points):
+    """Pick ``max_points`` of ``bars`` by Largest-Triangle-Three-Buckets on close."""
+    size = len(bars)
+    if size <= max_points or max_points < MIN_POINTS:
+        return bars
+    closes = [b['close'] for b in bars]
+    # Interior bars split into max_points - 2 buckets; first/last always kept
+    bounds = [1 + b for b in _bounds(size - 2, max_points - 2)]
+    picked = [bars[0]]
+    anchor = 0
+    for k in range(max_points - 2):
+        start, end = bounds[k], bounds[k + 1]
+        # Third vertex: the average of the next bucket (the last bar at the end)
+        next_start, next_end = (bounds[k + 1], bounds[k + 2]) if k + 2 < len(bounds) else (size - 1, size)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(closes[next_start:next_end]) / (next_end - next_start)
+        ax, ay = anchor, closes[anchor]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            # Twice the triangle area; the constant factor does not change the argmax
+            area = abs((ax - avg_x) * (closes[i] - ay) - (ax - i) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        picked.append(bars[best])
+        anchor = best
+    picked.append(bars[-1])
+    return picked
+
+
+def downsample(bars, max_points, mode='candle'):
+    """Reduce ``bars`` to at most ``max_points`` with the reducer for ``mode``."""
+    if mode == 'line':
+        return lttb(bars, max_points)
+    return bucket_ohlc(bars, max_points)
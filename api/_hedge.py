@@ -0,0 +1,122 @@
+"""Hedged requests: race a slow primary source against its fallback.
+
+The quote chain used to start Yahoo only after EODHD had failed or used up
+its whole timeout. :func:`race` starts the primary alone; if it has not
+answered within that source's adaptive threshold (the p90 of its recent
+latencies), the fallback is launched in parallel and the first usable
+result wins. Every finished call feeds its latency back into the tracker.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import _timing as timing
+
+
+HEDGE_MAX_WORKERS = 16
+
+
+class LatencyTracker:
+    """Recent latencies per source and the hedge threshold derived from them.
+
+    Until ``min_samples`` calls have been seen the threshold is ``default``;
+    after that it is the ``quantile`` of the last ``window`` samples, clamped
+    to ``[floor, cap]`` seconds.
+    """
+
+    def __init__(self, window=50, quantile=0.9, min_samples=5, default=1.5, floor=0.3, cap=5.0):
+        self.window = window
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.default = default
+        self.floor = floor
+        self.cap = cap
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, source, seconds):
+        with self._lock:
+            samples = self._samples.get(source)
+            if samples is None:
+                samples = self._samples[source] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def threshold(self, source):
+        with self._lock:
+            samples = sorted(self._samples.get(source, ()))
+        if len(samples) < self.min_samples:
+            return self.default
+        value = samples[min(len(samples) - 1, int(len(samples) * self.quantile))]
+        return min(max(value, self.floor), self.cap)
+
+    def snapshot(self):
+        """``{source: {'samples', 'threshold_ms'}}`` for diagnostics."""
+        with self._lock:
+            sources = {source: len(samples) for source, samples in self._samples.items()}
+        return {
+            source: {'samples': count, 'threshold_ms': round(self.threshold(source) * 1000)}
+            for source, count in sources.items()
+        }
+
+
+LATENCY = LatencyTracker()
+
+_pool = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS)
+
+
+def _timed(tracker, name, fn, record):
+    started = time.monotonic()
+    data, errors = fn()
+    # A step skipped by its circuit breaker returns neither data nor errors
+    # and says nothing about the source's latency.
+    if record and (data or errors):
+        tracker.record(name, time.monotonic() - started)
+    return data, errors
+
+
+def race(primary, fallback, tracker=None, record_primary=True):
+    """Run ``primary``, hedging with ``fallback`` once it is slower than usual.
+
+    ``primary`` and ``fallback`` are ``(source_name, fn)`` where ``fn()``
+    returns ``(data, errors)``. Returns ``(data, source_name, errors)`` for
+    the first step with data, or ``(None, None, errors)`` when both fail.
+
+    The losing call is cancelled if it has not started yet; a call already
+    blocked on a socket cannot be interrupted, so it finishes in the
+    background and only its latency is kept.
+    """
+    tracker = tracker or LATENCY
+    primary_name, primary_fn = primary
+    fallback_name, fallback_fn = fallback
+
+    pending = {
+        timing.submit(_pool, _timed, tracker, primary_name, primary_fn, record_primary): primary_name,
+    }
+    errors = []
+    launched = False
+
+    def launch_fallback():
+        future = timing.submit(_pool, _timed, tracker, fallback_name, fallback_fn, True)
+        pending[future] = fallback_name
+
+    done, _ = wait(pending, timeout=tracker.threshold(primary_name))
+    while True:
+        for future in done:
+            name = pending.pop(future)
+            try:
+                data, step_errors = future.result()
+            except Exception as e:
+                data, step_errors = None, [f"{name}: {type(e).__name__}: {str(e)}"]
+            errors.extend(step_errors)
+            if data:
+                for loser in pending:
+                    loser.cancel()
+                return data, name, errors
+        # Primary is slow (threshold passed) or already failed: hedge now
+        if not launched:
+            launch_fallback()
+            launched = True
+        if not pending:
+            return None, None, errors
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
@@ -0,0 +1,463 @@
+"""Shared HKMA/HKAB HIBOR fixing table for the quote and chart endpoints.
+
+HKMA returns every tenor (ir_overnight ... ir_12m) in each daily record, and
+HKAB's rates page lists every maturity, so one download serves all HIBOR
+symbols. The parsed table is cached until the next fixing is due: HKAB
+publishes once per Hong Kong business day at 11:15 HKT.
+
+The HKMA history is backfilled once per instance by fetching its newest
+``offset`` page, then (if that one is full) the older pages in parallel
+(about 2.4 years, enough for every chart range); later refreshes only ask
+for records since the last cached fixing and append them. Older pages that failed during the backfill are
+fetched again (below the oldest cached fixing) on later refreshes.
+"""
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import _http as http_client
+import _symbols as symbol_index
+import _timing as timing
+
+
+HKMA_HIBOR_URL = (
+    'https://api.hkma.gov.hk/public/market-data-and-statistics/'
+    'monthly-statistical-bulletin/er-ir/hk-interbank-ir-daily'
+    '?segment=hibor.fixing&sortby=end_of_day&sortorder=desc'
+)
+HKMA_PAGE_SIZE = 100
+# 600 business days covers the 2y (504 fixings) chart range
+HISTORY_PAGES = 6
+HKAB_HIBOR_URL = 'https://www.hkab.org.hk/en/rates/hibor'
+
+TENOR_MAP = {
+    'HIBORON': 'ir_overnight',
+    'HIBOR1W': 'ir_1w',
+    'HIBOR1M': 'ir_1m',
+    'HIBOR3M': 'ir_3m',
+    'HIBOR6M': 'ir_6m',
+    'HIBOR12M': 'ir_12m',
+}
+HKAB_MATURITY_MAP = {
+    'ir_overnight': 'Overnight',
+    'ir_1w': '1 Week',
+    'ir_1m': '1 Month',
+    'ir_3m': '3 Months',
+    'ir_6m': '6 Months',
+    'ir_12m': '12 Months',
+}
+
+# Approximate maturity in days, for plotting the curve on a time axis
+TENOR_DAYS = {
+    'ir_overnight': 1,
+    'ir_1w': 7,
+    'ir_1m': 30,
+    'ir_3m': 91,
+    'ir_6m': 182,
+    'ir_12m': 365,
+}
+
+HKT = timezone(timedelta(hours=8))
+FIXING_TIME = (11, 15)
+# HKMA has occasionally served a stale page from Vercel; older than this we
+# prefer HKAB's latest fixing.
+MAX_STALE_DAYS = 7
+# The fixing is due but not visible upstream yet: poll again this soon.
+FIXING_RETRY_SECONDS = 600
+# HKAB only has the latest row, so its page is re-read at most this often.
+HKAB_TTL_SECONDS = 1800
+# Back off this long after a failed/stale HKMA fetch or a failed HKAB page,
+# so callers go straight to the fallback (or error) instead of each retrying
+# a source that is down, yet a recovered source is picked up within minutes.
+HKMA_RETRY_SECONDS = 120
+HKAB_RETRY_SECONDS = 120
+
+_lock = threading.Lock()
+_tables = {}  # 'hkma' / 'hkab' -> (table, expires_at epoch seconds)
+_failures = {}  # 'hkab' -> (exception, retry_at epoch seconds)
+_inflight = {}  # 'hkma' / 'hkab' -> Future of the running fetch
+_history = {}  # end_of_day -> HKMA record, kept across refreshes
+_backfill_missing = 0  # older history pages a failed backfill did not get
+_pool = ThreadPoolExecutor(max_workers=HISTORY_PAGES, thread_name_prefix='hibor')
+
+
+def tenor_for(symbol):
+    """HKMA field for a synthetic HIBOR symbol: the ``tenor`` configured for
+    it in config.json, else :data:`TENOR_MAP` (defaults to 1-month)."""
+    route = symbol_index.route_for(symbol)
+    if route is not None and route.tenor:
+        return route.tenor
+    return TENOR_MAP.get(symbol, 'ir_1m')
+
+
+def fetch_hkma_page(offset=0, since=None, until=None):
+    """One page of HKMA records, newest first; ``since`` / ``until`` limit
+    it to fixings on or after / on or before those dates."""
+    url = f"{HKMA_HIBOR_URL}&pagesize={HKMA_PAGE_SIZE}&offset={offset}"
+    if since:
+        url += f"&from={since}"
+    if until:
+        url += f"&to={until}"
+    raw = http_client.get_json(url, timeout=5)
+    return [r for r in raw.get('result', {}).get('records', []) if r.get('end_of_day')]
+
+
+def fetch_hkma_history(pages=HISTORY_PAGES, until=None):
+    """Backfill ``pages`` pages of HKMA records (fixed on or before
+    ``until``, if given).
+
+    The newest page is fetched first and must succeed; only if it is full
+    are the older pages fetched, in parallel. Those are kept up to the
+    first one that fails or comes back short (the end of HKMA's data).
+    Returns ``(records, missing)``, ``missing`` being the number of pages
+    lost to a failure, to be fetched again later.
+    """
+    records = fetch_hkma_page(0, None, until)
+    complete = len(records) == HKMA_PAGE_SIZE
+    if not complete:
+        return records, 0
+    futures = [timing.submit(_pool, fetch_hkma_page, page * HKMA_PAGE_SIZE, None, until)
+               for page in range(1, pages)]
+    missing = 0
+    for index, future in enumerate(futures, 1):
+        if not complete:
+            future.cancel()
+            continue
+        try:
+            page = future.result()
+        except Exception:
+            missing = pages - index
+            complete = False
+            continue
+        records.extend(page)
+        complete = len(page) == HKMA_PAGE_SIZE
+    return records, missing
+
+
+def fetch_hkma_records():
+    """HKMA history merged into :data:`_history`: a full backfill the first
+    time, afterwards only the fixings since the newest cached one, plus any
+    older pages an earlier backfill failed to get."""
+    global _backfill_missing
+    with _lock:
+        newest = max(_history) if _history else None
+        oldest = min(_history) if _history else None
+        missing = _backfill_missing
+    restart = newest is None
+    if newest:
+        records = fetch_hkma_page(since=newest)
+        # More new fixings than one page (long-idle instance): start over
+        restart = len(records) == HKMA_PAGE_SIZE
+    if restart:
+        records, missing = fetch_hkma_history()
+    elif missing:
+        # Resume the truncated backfill below the oldest cached fixing
+        until = (date.fromisoformat(oldest) - timedelta(days=1)).isoformat()
+        try:
+            older, missing = fetch_hkma_history(missing, until)
+            records += older
+        except Exception:
+            pass
+    with _lock:
+        if restart:
+            _history.clear()
+        _history.update((r['end_of_day'], r) for r in records)
+        for day in sorted(_history)[:-HISTORY_PAGES * HKMA_PAGE_SIZE]:
+            del _history[day]
+        _backfill_missing = missing
+        return list(_history.values())
+
+
+def fetch_hkma_table():
+    """Refresh the HKMA history and split it into per-tenor series.
+
+    Returns ``{'source', 'as_of_date', 'series': {tenor: [(date, rate), ...]}}``
+    with each series sorted oldest first.
+    """
+    records = sorted(fetch_hkma_records(), key=lambda r: r['end_of_day'])
+
+    series = {}
+    for tenor in HKAB_MATURITY_MAP:
+        series[tenor] = [
+            (r['end_of_day'], float(r[tenor]))
+            for r in records if r.get(tenor) not in (None, 'NA')
+        ]
+    dates = [points[-1][0] for points in series.values() if points]
+    if not dates:
+        raise ValueError('HKMA returned no usable HIBOR records')
+    return {'source': 'hkma_hibor', 'as_of_date': max(dates), 'series': series}
+
+
+def parse_hkab_rates(html):
+    """``(as_of_date, {maturity: rate})`` from HKAB's rates page; the date is
+    None if the page does not state it."""
+    date_match = re.search(r'Rates as at 11:15a\.m\.<br/>Hong Kong Time on (\d{4})-(\d{1,2})-(\d{1,2})\.', html)
+    as_of_date = None
+    if date_match:
+        y, m, d = map(int, date_match.groups())
+        as_of_date = f'{y:04d}-{m:02d}-{d:02d}'
+
+    rates = {
+        maturity: float(rate)
+        for maturity, rate in re.findall(
+            r'<div class="general_table_cell hibor_maturity"><div>([^<]+)</div></div>'
+            r'<div class="general_table_cell last"><div>([0-9.]+)</div></div>',
+            html
+        )
+    }
+    return as_of_date, rates
+
+
+def fetch_hkab_table():
+    """Fetch HKAB's rates page once and parse the latest fixing for every maturity.
+
+    HKAB is the fixing publisher. This is the production fallback when HKMA's
+    monthly-statistical-bulletin API times out, returns 502, or serves stale rows.
+    """
+    headers = {
+        'User-Agent': 'Mozilla/5.0 MarketDashboard/1.0',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
+    last_error = None
+    html = None
+    for _ in range(3):
+        try:
+            html = http_client.get_text(HKAB_HIBOR_URL, headers=headers, timeout=12)
+            break
+        except Exception as exc:
+            last_error = exc
+    if html is None:
+        raise last_error
+
+    as_of_date, rates = parse_hkab_rates(html)
+    series = {}
+    for tenor, maturity in HKAB_MATURITY_MAP.items():
+        if maturity in rates:
+            series[tenor] = [(as_of_date or datetime.now(HKT).strftime('%Y-%m-%d'), rates[maturity])]
+    if not series:
+        raise ValueError('HKAB HIBOR rates not found')
+    return {'source': 'hkab_hibor', 'as_of_date': as_of_date, 'series': series}
+
+
+def next_fixing_refresh(as_of_date, now=None):
+    """Epoch seconds until which a table fixed on ``as_of_date`` is current.
+
+    A table is current until the next business-day fixing at 11:15 HKT. If that
+    fixing is already due but the upstream has not published it yet, retry in
+    a few minutes.
+    """
+    now = now or datetime.now(HKT)
+    fixed_on = datetime.strptime(as_of_date, '%Y-%m-%d').date() if as_of_date else now.date()
+    day = fixed_on + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    due = datetime(day.year, day.month, day.day, *FIXING_TIME, tzinfo=HKT)
+    if due <= now:
+        return time.time() + FIXING_RETRY_SECONDS
+    return due.timestamp()
+
+
+def _single_flight(name, fetch):
+    """Run ``fetch()`` once for ``name``; concurrent callers wait for that
+    run's result instead of starting their own.
+
+    The network I/O happens outside :data:`_lock`, so readers of the cached
+    tables are never blocked behind a slow upstream.
+    """
+    with _lock:
+        future = _inflight.get(name)
+        owner = future is None
+        if owner:
+            future = _inflight[name] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = fetch()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _inflight.pop(name, None)
+
+
+def _cached(name):
+    """``(hit, table)`` for a table still within its expiry (``table`` None
+    for a remembered HKMA miss); a recent HKAB failure is re-raised until
+    its retry time."""
+    with _lock:
+        table, expires_at = _tables.get(name, (None, 0.0))
+        error, retry_at = _failures.get(name, (None, 0.0))
+    now = time.time()
+    if now < expires_at:
+        return True, table
+    if error is not None and now < retry_at:
+        raise error
+    return False, None
+
+
+def _refresh_hkab(now):
+    hit, table = _cached('hkab')
+    if hit:
+        return table
+    try:
+        table = fetch_hkab_table()
+    except Exception as exc:
+        with _lock:
+            _failures['hkab'] = (exc, time.time() + HKAB_RETRY_SECONDS)
+        raise
+    expires_at = min(next_fixing_refresh(table['as_of_date'], now),
+                     time.time() + HKAB_TTL_SECONDS)
+    with _lock:
+        _tables['hkab'] = (table, expires_at)
+        _failures.pop('hkab', None)
+    return table
+
+
+def _refresh_hkma(now):
+    hit, table = _cached('hkma')
+    if hit:
+        return table
+    try:
+        table = fetch_hkma_table()
+        latest = datetime.strptime(table['as_of_date'], '%Y-%m-%d').date()
+        if (now.date() - latest).days > MAX_STALE_DAYS:
+            table = None
+    except Exception:
+        table = None
+    # A failed/stale HKMA fetch is remembered too, so the remaining symbols
+    # go straight to HKAB instead of retrying HKMA each.
+    if table is not None:
+        expires_at = next_fixing_refresh(table['as_of_date'], now)
+        if _backfill_missing:
+            # Short history: retry the missing pages soon, not at the next fixing
+            expires_at = min(expires_at, time.time() + HKMA_RETRY_SECONDS)
+    else:
+        expires_at = time.time() + HKMA_RETRY_SECONDS
+    with _lock:
+        _tables['hkma'] = (table, expires_at)
+    return table
+
+
+def get_hkab_table(now=None):
+    """Return HKAB's latest fixings, fetching the page at most once per TTL.
+
+    A failed fetch is re-raised to every caller for
+    :data:`HKAB_RETRY_SECONDS` instead of being retried by each.
+    """
+    hit, table = _cached('hkab')
+    if hit:
+        return table
+    return _single_flight('hkab', lambda: _refresh_hkab(now))
+
+
+def get_hibor_table(now=None):
+    """Return the cached HIBOR table, fetching it at most once per fixing.
+
+    Concurrent callers (one per HIBOR symbol in a quotes request) share a
+    single HKMA download; when HKMA fails or is stale they share a single
+    HKAB page fetch instead.
+    """
+    now = now or datetime.now(HKT)
+    hit, table = _cached('hkma')
+    if not hit:
+        table = _single_flight('hkma', lambda: _refresh_hkma(now))
+    if table is not None:
+        return table
+    return get_hkab_table(now)
+
+
+def tenor_series(symbol):
+    """``(source, [(date, rate), ...])`` for one HIBOR symbol.
+
+    Falls back to HKAB's latest fixing when HKMA has no usable value for the tenor.
+    """
+    tenor = tenor_for(symbol)
+    table = get_hibor_table()
+    points = table['series'].get(tenor)
+    if not points and table['source'] != 'hkab_hibor':
+        table = get_hkab_table()
+        points = table['series'].get(tenor)
+    if not points:
+        raise ValueError(f'HIBOR rate not found for {HKAB_MATURITY_MAP.get(tenor, tenor)}')
+    return table['source'], points
+
+
+def hibor_quote(symbol):
+    """Latest fixing for one HIBOR symbol in the quotes payload shape."""
+    source, points = tenor_series(symbol)
+    as_of_date, price = points[-1]
+    prev_close = points[-2][1] if len(points) >= 2 else price
+    change_pct = ((price - prev_close) / prev_close * 100) if prev_close else 0
+    return {
+        'price': price,
+        'change_pct': round(change_pct, 4),
+        'prev_close': prev_close,
+        'sparkline': [rate for _, rate in points[-7:]],
+        'source': source,
+        'as_of_date': as_of_date
+    }
+
+
+def fixings_by_date():
+    """``(source, {date: {tenor: rate}})`` for every cached fixing.
+
+    Built in one pass over the shared table, so all tenors of all dates come
+    from a single (cached) download. While HKMA is failing or stale, the
+    backfilled HKMA history is kept under HKAB's latest fixing.
+    """
+    table = get_hibor_table()
+    rows = {}
+    if table['source'] == 'hkab_hibor':
+        with _lock:
+            for day, record in _history.items():
+                rows[day] = {
+                    tenor: float(record[tenor])
+                    for tenor in HKAB_MATURITY_MAP if record.get(tenor) not in (None, 'NA')
+                }
+    for tenor, points in table['series'].items():
+        for day, rate in points:
+            rows.setdefault(day, {})[tenor] = rate
+    return table['source'], rows
+
+
+def tenor_history(symbol):
+    """Fixing history for one HIBOR symbol.
+
+    Like :func:`tenor_series`, but while HKMA is failing or stale the
+    previously backfilled HKMA history is kept and HKAB's latest fixing is
+    appended to it, instead of charting HKAB's single point.
+    """
+    source, points = tenor_series(symbol)
+    if source != 'hkab_hibor':
+        return points
+    tenor = tenor_for(symbol)
+    with _lock:
+        history = sorted(
+            (day, float(r[tenor])) for day, r in _history.items() if r.get(tenor) not in (None, 'NA')
+        )
+    if history:
+        points = history + [p for p in points if p[0] > history[-1][0]]
+    return points
+
+
+def hibor_chart_rows(symbol, limit):
+    """Last ``limit`` fixings for one HIBOR symbol as daily OHLC rows.
+
+    HIBOR is a rate fixing, not a traded instrument, so OHLC are all set to the
+    same daily fixing value.
+    """
+    points = tenor_history(symbol)
+    return [{
+        'time': date,
+        'open': rate,
+        'high': rate,
+        'low': rate,
+        'close': rate,
+        'volume': 0
+    } for date, rate in points[-limit:]]
@@ -0,0 +1,219 @@
+"""Shared keep-alive HTTP client for the upstream fetch helpers in api/.
+
+``urllib.request.urlopen`` opens a new TCP+TLS connection for every call. This
+module keeps idle connections per host (eodhd.com, query1/query2.finance.
+yahoo.com, api.hkma.gov.hk, ...) so symbols in one request, and requests on a
+warm instance, reuse them. Responses are requested gzip-encoded and decoded
+transparently.
+
+Errors mirror urllib so existing handlers keep working: HTTP status >= 400
+raises ``urllib.error.HTTPError`` and connection/timeout failures raise
+``urllib.error.URLError``.
+"""
+import gzip
+import http.client
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import zlib
+
+import _timing as timing
+
+
+DEFAULT_TIMEOUT = 8
+USER_AGENT = 'MarketDashboard/1.0'
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+MAX_IDLE_PER_HOST = 8
+MAX_REDIRECTS = 5
+
+# Errors that mean a reused keep-alive connection was closed by the server
+# while idle; the request is retried once on a fresh connection.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+def _set_cookies(headers):
+    """``{name: value}`` from a response's Set-Cookie headers."""
+    jar = {}
+    for header in headers.get_all('Set-Cookie') or []:
+        pair = header.split(';', 1)[0]
+        if '=' in pair:
+            name, value = pair.split('=', 1)
+            jar[name.strip()] = value.strip()
+    return jar
+
+
+class Response:
+    """A fully-read upstream response."""
+
+    def __init__(self, url, status, reason, headers, body, cookies=None):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self._cookies = cookies
+
+    def json(self):
+        return json.loads(self.body)
+
+    def text(self, encoding='utf-8'):
+        return self.body.decode(encoding, 'replace')
+
+    def cookies(self):
+        """``{name: value}`` set by this response and by any redirect hops
+        that led to it (a session cookie is often set on the 3xx)."""
+        if self._cookies is not None:
+            return dict(self._cookies)
+        return _set_cookies(self.headers)
+
+
+class ConnectionPool:
+    """Per-host pool of idle persistent connections (thread-safe)."""
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        conn_cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_cls(host, port, timeout=timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _send(self, method, url, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or 'https'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return resp, body
+
+    def request(self, url, headers=None, timeout=DEFAULT_TIMEOUT, method='GET',
+                raise_for_status=True):
+        """Perform a request and return a :class:`Response` with decoded body."""
+        send_headers = {
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+        send_headers.update(headers or {})
+
+        cookies = {}
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                resp, body = self._send(method, url, send_headers, timeout)
+            except (OSError, http.client.HTTPException) as exc:
+                raise urllib.error.URLError(exc) from exc
+            cookies.update(_set_cookies(resp.headers))
+
+            location = resp.getheader('Location')
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            break
+
+        body = _decode_body(body, resp.getheader('Content-Encoding', ''))
+        if raise_for_status and resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+        return Response(url, resp.status, resp.reason, resp.headers, body, cookies)
+
+
+def _decode_body(body, encoding):
+    encoding = (encoding or '').lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+_pool = ConnectionPool()
+
+
+def request(url, headers=None, timeout=DEFAULT_TIMEOUT, method='GET', raise_for_status=True):
+    """Request ``url`` through the shared connection pool.
+
+    Every call (including failures) is recorded in the current request's
+    upstream timings, see api/_timing.py.
+    """
+    started = time.monotonic()
+    status = None
+    nbytes = 0
+    try:
+        resp = _pool.request(url, headers=headers, timeout=timeout, method=method,
+                             raise_for_status=raise_for_status)
+        status, nbytes = resp.status, len(resp.body)
+        return resp
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+        raise
+    except Exception as exc:
+        status = type(exc).__name__
+        raise
+    finally:
+        timing.record_call(url, status, nbytes, (time.monotonic() - started) * 1000)
+
+
+def get_json(url, headers=None, timeout=DEFAULT_TIMEOUT):
+    """GET ``url`` through the shared pool and parse the body as JSON."""
+    return request(url, headers=headers, timeout=timeout).json()
+
+
+def get_text(url, headers=None, timeout=DEFAULT_TIMEOUT):
+    """GET ``url`` through the shared pool and decode the body as UTF-8."""
+    return request(url, headers=headers, timeout=timeout).text()
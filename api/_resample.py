@@ -0,0 +1,73 @@
+"""Coarser chart intervals derived from cached finer bars.
+
+``1wk`` / ``1mo`` are built from the cached daily series and ``15m`` /
+``1h`` from the cached 5m window, so these intervals never cost an
+upstream request of their own. Bars are grouped in one pass over the
+(time-ordered) list and each group merged into one candle: first open,
+highest high, lowest low, last close, summed volume, stamped with the
+time of its first bar.
+
+Buckets follow the exchange calendar: weeks are ISO weeks (Monday-based)
+and months calendar months of the trading dates; intraday buckets are
+counted in the session's own time zone from its open time, so NYSE hours
+start at 09:30 and CME hours at 18:00 ET across DST changes.
+"""
+from datetime import date, datetime, timezone
+from itertools import groupby
+
+import _calendar as calendar
+from _downsample import merge
+
+# Derived interval -> (interval it is built from, bucket size in minutes)
+DERIVED_INTERVALS = {
+    '1wk': ('1d', None),
+    '1mo': ('1d', None),
+    '15m': ('5m', 15),
+    '1h': ('5m', 60),
+}
+
+
+def base_interval(interval):
+    """The cached interval ``interval`` is derived from (itself if not derived)."""
+    return DERIVED_INTERVALS.get(interval, (interval, None))[0]
+
+
+def _week(day):
+    return date.fromisoformat(day).isocalendar()[:2]
+
+
+def _month(day):
+    return day[:7]
+
+
+def _intraday_key(session_name, minutes):
+    """Bucket key for Unix-second bar times: ``minutes``-long buckets in the
+    session's local time, counted from its open time."""
+    session = calendar.SESSIONS.get(session_name) if session_name else None
+    tz = session.tz if session else timezone.utc
+    open_time = session.windows[0].open_time if session else None
+    anchor = open_time.hour * 60 + open_time.minute if open_time else 0
+    offsets = {}
+
+    def key(ts):
+        hour = ts // 3600
+        offset = offsets.get(hour)
+        if offset is None:
+            # UTC offset changes at most hourly; memoized per hour of bars
+            offset = offsets[hour] = int(datetime.fromtimestamp(hour * 3600, tz).utcoffset().total_seconds())
+        return ((ts + offset) // 60 - anchor) // minutes
+
+    return key
+
+
+def resample(bars, interval, session=None):
+    """``bars`` (daily or 5m) aggregated into ``interval`` candles."""
+    if interval not in DERIVED_INTERVALS or not bars:
+        return bars
+    if interval == '1wk':
+        key = _week
+    elif interval == '1mo':
+        key = _month
+    else:
+        key = _intraday_key(session, DERIVED_INTERVALS[interval][1])
+    return [merge(list(run)) for _, run in groupby(bars, key=lambda b: key(b['time']))]
@@ -0,0 +1,166 @@
+"""Daily-close series for quote sparklines.
+
+Sparklines only need the last few daily closes, which change once per
+trading day, so they are fetched for many symbols at once from Yahoo's
+spark endpoint and cached per symbol until the next daily close (the
+17:00 New York rollover for FX, next UTC midnight for 24/7 markets).
+Polling /api/quotes?sparkline=N therefore costs one batched call per
+trading day, not a history call per symbol.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import urllib.parse
+
+import _http as http_client
+import _calendar as calendar
+import _timing as timing
+from _cache import TTLCache
+
+
+SPARK_URL = 'https://query1.finance.yahoo.com/v8/finance/spark'
+# Yahoo rejects spark requests with more than 20 symbols
+SPARK_BATCH_SIZE = 20
+# One month of daily bars covers the longest sparkline we serve
+SPARK_RANGE = '1mo'
+MAX_POINTS = 20
+
+CLOSES_CACHE = TTLCache(256)
+# Past its refresh time a series is still served while a refresh runs
+CLOSES_STALE_SECONDS = 7 * 86400
+# Symbols Yahoo cannot price (or a failed fetch) are not retried on every poll
+MISS_TTL_SECONDS = 300
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='sparkline')
+
+
+def _parse_spark(payload):
+    """``{symbol: (timestamps, closes)}`` from a v8 (or v7) spark response."""
+    series = {}
+    if isinstance(payload.get('spark'), dict):
+        for item in payload['spark'].get('result') or []:
+            response = (item.get('response') or [{}])[0]
+            quote = (response.get('indicators', {}).get('quote') or [{}])[0]
+            series[item.get('symbol')] = (response.get('timestamp') or [], quote.get('close') or [])
+        return series
+    for symbol, item in payload.items():
+        if isinstance(item, dict):
+            series[symbol] = (item.get('timestamp') or [], item.get('close') or [])
+    return series
+
+
+def fetch_daily_closes(symbols):
+    """Daily ``[(timestamp, close), ...]`` for ``symbols``, batched per call."""
+    closes = {}
+    for i in range(0, len(symbols), SPARK_BATCH_SIZE):
+        chunk = symbols[i:i + SPARK_BATCH_SIZE]
+        url = (
+            f"{SPARK_URL}?symbols={urllib.parse.quote(','.join(chunk), safe=',')}"
+            f"&range={SPARK_RANGE}&interval=1d"
+        )
+        payload = http_client.get_json(url, headers={'User-Agent': http_client.BROWSER_USER_AGENT}, timeout=6)
+        for symbol, (timestamps, values) in _parse_spark(payload).items():
+            if symbol in chunk:
+                closes[symbol] = [(ts, c) for ts, c in zip(timestamps, values) if c is not None]
+    return closes
+
+
+def _completed_closes(points, session, now):
+    """Closes of completed trading days: while the market is open the last
+    bar is today's partial one and is dropped."""
+    if not points:
+        return []
+    if not calendar.is_open(session, now):
+        return [c for _, c in points]
+    today = calendar.local_date(session, now)
+    tz = calendar.SESSIONS[session].tz if calendar.SESSIONS.get(session) else timezone.utc
+    return [c for ts, c in points if datetime.fromtimestamp(ts, tz).date() < today]
+
+
+def _next_rollover(session, now):
+    """First daily close after ``now`` (or after the next open while the
+    market is closed), plus :data:`_calendar.SETTLE_SECONDS`.
+
+    FX trades one Sunday-Friday window but prints a daily bar at each 17:00
+    New York rollover; this is that boundary, and the session close for
+    markets with a window per day.
+    """
+    spec = calendar.SESSIONS[session]
+    start = now if calendar.is_open(session, now) else calendar.next_open(session, now) or now
+    close_time = spec.windows[0].close_time
+    day = start.astimezone(spec.tz).date()
+    while True:
+        rollover = datetime.combine(day, close_time, tzinfo=spec.tz).astimezone(timezone.utc)
+        if rollover > start:
+            return rollover + timedelta(seconds=calendar.SETTLE_SECONDS)
+        day += timedelta(days=1)
+
+
+def refresh_ttl(session, now=None):
+    """Seconds a series stays fresh: until the session's next daily close
+    (the 17:00 New York rollover for FX), or the next UTC midnight for
+    markets without one."""
+    now = now or datetime.now(timezone.utc)
+    until = calendar.next_close(session, now)
+    if until is None:
+        until = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    else:
+        until = min(until, _next_rollover(session, now))
+    return max(60, int((until - now).total_seconds()))
+
+
+def _refresh(symbols, sessions):
+    """Fetch and cache series for ``symbols``; returns ``{symbol: closes}``."""
+    timing.set_symbol(','.join(symbols))
+    now = datetime.now(timezone.utc)
+    try:
+        fetched = fetch_daily_closes(symbols)
+    except Exception:
+        fetched = None
+    series = {}
+    for symbol in symbols:
+        closes = _completed_closes((fetched or {}).get(symbol), sessions.get(symbol), now)[-MAX_POINTS:]
+        if closes:
+            CLOSES_CACHE.set(symbol, closes, refresh_ttl(sessions.get(symbol), now), CLOSES_STALE_SECONDS)
+            series[symbol] = closes
+        else:
+            previous = CLOSES_CACHE.get(symbol)[0] if fetched is None else None
+            # A failed refresh keeps serving the stale series it had, marked
+            # fresh for MISS_TTL_SECONDS so an outage is not retried per poll
+            CLOSES_CACHE.set(symbol, previous or [], MISS_TTL_SECONDS,
+                             CLOSES_STALE_SECONDS if previous else 0)
+    return series
+
+
+def load(sessions):
+    """Cached daily closes for ``{yahoo_symbol: session}``.
+
+    Stale series are returned as-is and refreshed in the background; only
+    symbols never seen before are fetched inline, in one batched call.
+    """
+    series = {}
+    stale = []
+    missing = []
+    for symbol in sessions:
+        closes, state = CLOSES_CACHE.get(symbol)
+        if closes is None:
+            missing.append(symbol)
+            continue
+        if state == 'stale':
+            stale.append(symbol)
+        if closes:
+            series[symbol] = closes
+    if stale:
+        CLOSES_CACHE.revalidate(stale, lambda keys: _refresh(keys, sessions))
+    if missing:
+        series.update(_refresh(missing, sessions))
+    return series
+
+
+def load_async(sessions):
+    """:func:`load` on the sparkline pool, so it overlaps the quote fan-out."""
+    return timing.submit(_pool, load, sessions)
+
+
+def sparkline(closes, n):
+    """Last ``n`` closes, rounded for the payload."""
+    return [round(c, 6) for c in closes[-n:]]
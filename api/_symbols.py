@@ -0,0 +1,90 @@
+"""Symbol routing index built from config.json at import time.
+
+Lets /api/quotes accept short canonical requests (``?set=all``,
+``?category=metals``) and resolve each symbol's source, Yahoo fallback
+symbol and HIBOR tenor on the server with O(1) lookups, instead of the
+frontend zipping three parallel comma lists into every URL.
+"""
+import json
+import os
+from collections import namedtuple
+
+import _calendar as calendar
+
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+Route = namedtuple('Route', ['symbol', 'source', 'yahoo_symbol', 'tenor', 'category', 'session'])
+
+
+def load_index(path=CONFIG_PATH):
+    """Build ``(routes, categories)`` from config.json.
+
+    ``routes`` maps symbol -> Route; ``categories`` maps category id -> symbols
+    in config order. An asset's trading ``session`` (see api/_calendar.py)
+    can be set in config and is otherwise inferred from the symbol suffix.
+    A missing or unreadable config yields empty tables, so callers fall
+    back to explicit query parameters.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+
+    routes = {}
+    categories = {}
+    for category in config.get('categories', []):
+        symbols = categories.setdefault(category['id'], [])
+        for asset in category.get('assets', []):
+            symbol = asset['symbol']
+            yahoo_symbol = asset.get('yahoo_symbol') or symbol
+            routes[symbol] = Route(
+                symbol=symbol,
+                source=asset.get('source', 'eodhd'),
+                yahoo_symbol=yahoo_symbol,
+                tenor=asset.get('tenor'),
+                category=category['id'],
+                session=asset.get('session') or calendar.infer_session(symbol, yahoo_symbol),
+            )
+            symbols.append(symbol)
+    return routes, categories
+
+
+SYMBOL_ROUTES, CATEGORY_SYMBOLS = load_index()
+SYMBOL_SETS = {
+    'all': [symbol for symbols in CATEGORY_SYMBOLS.values() for symbol in symbols],
+}
+
+
+def route_for(symbol):
+    """The configured Route for ``symbol``, or None if it is not in config.json."""
+    return SYMBOL_ROUTES.get(symbol)
+
+
+def session_for(symbol, yahoo_symbol=None):
+    """Trading session name for ``symbol``: config first, then suffix inference."""
+    route = SYMBOL_ROUTES.get(symbol)
+    if route is not None:
+        return route.session
+    return calendar.infer_session(symbol, yahoo_symbol)
+
+
+def resolve_symbols(set_name=None, categories=None):
+    """Symbols for a named set and/or comma-separated category ids.
+
+    Raises ValueError for an unknown set or category.
+    """
+    symbols = []
+    if set_name:
+        if set_name not in SYMBOL_SETS:
+            raise ValueError(f'Unknown symbol set: {set_name}')
+        symbols.extend(SYMBOL_SETS[set_name])
+    for category in (categories or '').split(','):
+        category = category.strip()
+        if not category:
+            continue
+        if category not in CATEGORY_SYMBOLS:
+            raise ValueError(f'Unknown category: {category}')
+        symbols.extend(CATEGORY_SYMBOLS[category])
+    return list(dict.fromkeys(symbols))
@@ -0,0 +1,131 @@
+"""Per-request upstream call timings for Server-Timing and ?debug=timing.
+
+Each handler starts a :class:`Timings` recorder for its request; the shared
+HTTP client (api/_http.py) records every upstream call into whichever
+recorder is current. The recorder lives in a context variable, so worker
+threads only see it when submitted through :func:`submit`.
+"""
+import contextvars
+import threading
+import time
+import urllib.parse
+
+
+_current = contextvars.ContextVar('upstream_timings', default=None)
+_symbol = contextvars.ContextVar('upstream_symbol', default=None)
+
+# host (or host + path prefix) -> source label used in Server-Timing
+SOURCE_HOSTS = [
+    ('query2.finance.yahoo.com', '/v1/test/getcrumb', 'yahoo_crumb'),
+    ('fc.yahoo.com', '', 'yahoo_crumb'),
+    ('finance.yahoo.com', '', 'yahoo'),
+    ('eodhd.com', '', 'eodhd'),
+    ('api.hkma.gov.hk', '', 'hkma'),
+    ('www.hkab.org.hk', '', 'hkab'),
+    ('goldprice.org', '', 'goldprice'),
+    ('api.binance.com', '', 'binance'),
+]
+
+
+def source_for_url(url):
+    """Short source label for an upstream URL (falls back to the host name)."""
+    parts = urllib.parse.urlsplit(url)
+    host = parts.hostname or ''
+    for suffix, path_prefix, label in SOURCE_HOSTS:
+        if host.endswith(suffix) and parts.path.startswith(path_prefix):
+            return label
+    return host
+
+
+class Timings:
+    """Upstream calls made while serving one request."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, url, status, nbytes, duration_ms, symbol=None):
+        source = source_for_url(url)
+        with self._lock:
+            attempt = 1 + sum(1 for c in self.calls if c['url'] == url)
+            self.calls.append({
+                'source': source,
+                'symbol': symbol,
+                'status': status,
+                'bytes': nbytes,
+                'attempt': attempt,
+                'ms': round(duration_ms, 1),
+                'url': url,
+            })
+
+    def by_source(self):
+        """``{source: {'calls', 'ms', 'bytes', 'errors'}}`` aggregated over calls."""
+        totals = {}
+        with self._lock:
+            calls = list(self.calls)
+        for call in calls:
+            entry = totals.setdefault(call['source'], {'calls': 0, 'ms': 0.0, 'bytes': 0, 'errors': 0})
+            entry['calls'] += 1
+            entry['ms'] = round(entry['ms'] + call['ms'], 1)
+            entry['bytes'] += call['bytes']
+            if not isinstance(call['status'], int) or call['status'] >= 400:
+                entry['errors'] += 1
+        return totals
+
+    def total_ms(self):
+        return round((time.monotonic() - self.started) * 1000, 1)
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per source plus the total."""
+        metrics = []
+        for source, entry in self.by_source().items():
+            name = ''.join(ch if ch.isalnum() or ch in '_-' else '_' for ch in source)
+            metrics.append(f'{name};dur={entry["ms"]};desc="{entry["calls"]} calls"')
+        metrics.append(f'total;dur={self.total_ms()}')
+        return ', '.join(metrics)
+
+    def to_json(self):
+        """Detail for ``?debug=timing`` (API keys are stripped from URLs)."""
+        with self._lock:
+            calls = [dict(c, url=_redact(c['url'])) for c in self.calls]
+        return {
+            'total_ms': self.total_ms(),
+            'by_source': self.by_source(),
+            'calls': calls,
+        }
+
+
+def _redact(url):
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = [(k, '***' if k == 'api_token' else v) for k, v in query]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query, safe=',*')))
+
+
+def start():
+    """Start recording upstream calls for the current request."""
+    timings = Timings()
+    _current.set(timings)
+    _symbol.set(None)
+    return timings
+
+
+def current():
+    return _current.get()
+
+
+def set_symbol(symbol):
+    """Attribute upstream calls made from here on (in this context) to ``symbol``."""
+    _symbol.set(symbol)
+
+
+def record_call(url, status, nbytes, duration_ms):
+    timings = _current.get()
+    if timings is not None:
+        timings.record(url, status, nbytes, duration_ms, _symbol.get())
+
+
+def submit(executor, fn, *args, **kwargs):
+    """``executor.submit`` that carries the current request's recorder along."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,237 @@
+"""Yahoo Finance helpers shared by the quote and chart endpoints.
+
+Yahoo's query APIs want a session cookie plus a matching crumb. Getting one
+costs two round trips (fc.yahoo.com, then getcrumb), so :data:`SESSION`
+keeps it for the life of a warm instance and only refreshes it when Yahoo
+rejects it. From cloud IPs the crumb is often unobtainable; requests then
+go out unauthenticated through the same code path.
+
+The v7 quote endpoint takes many symbols per call, so one request can price
+every Yahoo-bound symbol instead of pulling a 5-day v8 chart per symbol.
+"""
+import contextvars
+import threading
+import time
+import urllib.error
+import urllib.parse
+from datetime import date
+
+import _http as http_client
+import _timing as timing
+
+
+QUOTE_URL = 'https://query2.finance.yahoo.com/v7/finance/quote'
+# Stay well inside the URL length Yahoo accepts for ?symbols=
+QUOTE_BATCH_SIZE = 50
+# Crumbs stay valid for a long time; refresh proactively after this anyway
+CRUMB_TTL_SECONDS = 6 * 3600
+# After failing to obtain a crumb, go unauthenticated for this long
+CRUMB_RETRY_SECONDS = 300
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def get_crumb():
+    """Fetch a new Yahoo Finance crumb and cookie header (two round trips)."""
+    headers = {'User-Agent': http_client.BROWSER_USER_AGENT}
+    # fc.yahoo.com answers with an error status but sets the session cookie
+    resp = http_client.request('https://fc.yahoo.com', headers=headers, timeout=3,
+                               raise_for_status=False)
+    cookie = '; '.join(f'{name}={value}' for name, value in resp.cookies().items())
+    crumb = http_client.get_text('https://query2.finance.yahoo.com/v1/test/getcrumb',
+                                 headers=dict(headers, Cookie=cookie), timeout=3)
+    return crumb, cookie
+
+
+def is_crumb_rejected(exc):
+    """True when Yahoo refused the request because of the crumb/cookie."""
+    if not isinstance(exc, urllib.error.HTTPError):
+        return False
+    if exc.code == 401:
+        return True
+    try:
+        body = exc.read()
+    except Exception:
+        return False
+    return b'invalid crumb' in body.lower() or b'invalid cookie' in body.lower()
+
+
+class CrumbSession:
+    """Cached crumb + cookie shared by every Yahoo request of an instance.
+
+    The crumb is fetched on first use and reused until it expires or Yahoo
+    answers 401 / "Invalid Crumb", which triggers one refresh and retry. If
+    no crumb can be obtained, requests are sent without one for
+    ``retry_after`` seconds before trying again.
+    """
+
+    def __init__(self, ttl=CRUMB_TTL_SECONDS, retry_after=CRUMB_RETRY_SECONDS):
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._crumb = None
+        self._cookie = ''
+        self._expires_at = 0.0
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def credentials(self):
+        """``(crumb, cookie)``; ``(None, '')`` while unauthenticated."""
+        with self._lock:
+            now = time.time()
+            if self._crumb and now < self._expires_at:
+                return self._crumb, self._cookie
+            if now < self._unavailable_until:
+                return None, ''
+            try:
+                self._crumb, self._cookie = get_crumb()
+                self._expires_at = now + self.ttl
+            except Exception:
+                self._crumb, self._cookie = None, ''
+                self._unavailable_until = now + self.retry_after
+            return self._crumb, self._cookie
+
+    def invalidate(self, crumb, unavailable=False):
+        """Drop ``crumb`` (if still current) so the next call fetches a new one."""
+        with self._lock:
+            if crumb is not None and crumb != self._crumb:
+                return  # another thread already refreshed it
+            self._crumb, self._cookie = None, ''
+            self._expires_at = 0.0
+            if unavailable:
+                self._unavailable_until = time.time() + self.retry_after
+
+    def get_json(self, url, timeout=8):
+        """GET a Yahoo query API ``url`` with the session's crumb and cookie.
+
+        A rejected crumb is refreshed and the request retried once; if the
+        fresh one is rejected too, the request is repeated unauthenticated.
+        """
+        crumb, cookie = self.credentials()
+        try:
+            return _get_json(url, crumb, cookie, timeout)
+        except urllib.error.HTTPError as e:
+            if crumb is None or not is_crumb_rejected(e):
+                raise
+        self.invalidate(crumb)
+        crumb, cookie = self.credentials()
+        try:
+            return _get_json(url, crumb, cookie, timeout)
+        except urllib.error.HTTPError as e:
+            if crumb is None or not is_crumb_rejected(e):
+                raise
+        self.invalidate(crumb, unavailable=True)
+        return _get_json(url, None, '', timeout)
+
+
+def _get_json(url, crumb, cookie, timeout):
+    headers = {'User-Agent': http_client.BROWSER_USER_AGENT}
+    if crumb:
+        sep = '&' if '?' in url else '?'
+        url = f"{url}{sep}crumb={urllib.parse.quote(crumb)}"
+        headers['Cookie'] = cookie
+    return http_client.get_json(url, headers=headers, timeout=timeout)
+
+
+SESSION = CrumbSession()
+
+
+def _utc_date(ts):
+    """``YYYY-MM-DD`` (UTC) of a Unix timestamp, without a datetime round trip."""
+    return date.fromordinal(_EPOCH_ORDINAL + int(ts) // 86400).isoformat()
+
+
+def normalize_chart(result, date_strings=False):
+    """OHLCV bars from one v8 ``chart.result`` entry.
+
+    Works column-wise: the quote arrays are padded to the timestamp count
+    once and zipped, so there are no per-bar bounds checks. Bars without a
+    close are dropped; a missing (or zero) open/high/low falls back to the
+    close and a missing volume to 0. ``date_strings`` turns the timestamps
+    into UTC ``YYYY-MM-DD`` dates (daily bars), otherwise they are kept.
+    """
+    timestamps = result.get('timestamp') or []
+    quote = (result.get('indicators', {}).get('quote') or [{}])[0]
+    size = len(timestamps)
+
+    def column(name):
+        values = (quote.get(name) or [])[:size]
+        return values + [None] * (size - len(values))
+
+    times = map(_utc_date, timestamps) if date_strings else timestamps
+    return [
+        {'time': t, 'open': o or c, 'high': h or c, 'low': l or c, 'close': c, 'volume': v or 0}
+        for t, o, h, l, c, v in zip(times, column('open'), column('high'), column('low'),
+                                    column('close'), column('volume'))
+        if c is not None
+    ]
+
+
+def parse_quote(row):
+    """One v7 ``quoteResponse.result`` row in the quotes payload shape (or None)."""
+    price = row.get('regularMarketPrice')
+    if not price:
+        return None
+    prev_close = row.get('regularMarketPreviousClose') or 0
+    change_pct = ((price - prev_close) / prev_close * 100) if prev_close else 0
+    return {
+        'price': price,
+        'change_pct': round(change_pct, 4),
+        'prev_close': prev_close,
+        'sparkline': [],
+        'source': 'yahoo'
+    }
+
+
+def fetch_quotes(symbols):
+    """Quote ``symbols`` with one v7 call per :data:`QUOTE_BATCH_SIZE` symbols.
+
+    Returns ``{yahoo_symbol: quote}``; symbols Yahoo does not price are
+    left out.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    quotes = {}
+    for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+        chunk = symbols[i:i + QUOTE_BATCH_SIZE]
+        url = f"{QUOTE_URL}?symbols={urllib.parse.quote(','.join(chunk), safe=',')}"
+        data = SESSION.get_json(url, timeout=6)
+        for row in (data.get('quoteResponse') or {}).get('result') or []:
+            quote = parse_quote(row)
+            if quote and row.get('symbol') in chunk:
+                quotes[row['symbol']] = quote
+    return quotes
+
+
+class QuoteBatch:
+    """One lazily fetched v7 quote call shared by every symbol of a request.
+
+    Nothing is fetched until the first :meth:`get`; concurrent callers wait
+    for that single call. A failed batch is remembered as empty so callers
+    fall back to their per-symbol path instead of retrying it.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.error = None
+        self._quotes = None
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        timing.set_symbol(','.join(self.symbols))
+        return fetch_quotes(self.symbols)
+
+    def get(self, symbol):
+        """Batched quote for ``symbol``, or None if the batch omitted it."""
+        if symbol not in self.symbols:
+            return None
+        with self._lock:
+            if self._quotes is None:
+                try:
+                    # Own context so the batch's upstream calls are labelled
+                    # with all its symbols, not the first caller's.
+                    self._quotes = contextvars.copy_context().run(self._fetch)
+                except Exception as e:
+                    self.error = e
+                    self._quotes = {}
+        return self._quotes.get(symbol)
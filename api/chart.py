@@ -7,314 +7,47 @@ Handles:
 
 Query params:
   symbol    - EODHD symbol (e.g. GLD.US, BTC-USD.CC)
-  range     - 1d | 5d | 3mo | 1y
-  interval  - 5m | 1d (ignored for EODHD; inferred from range)
+  range     - 1d | 5d | 1mo | 3mo | 6mo | 1y | 2y (daily ranges are the last
+              5/21/63/126/252/504 trading days of one cached 2y series;
+              calendar days, 5/30/91/182/365/730, for crypto)
+  interval  - 5m | 1d (5m bars come from a cached rolling 4-day window);
+              1wk | 1mo are resampled from the daily series and 15m | 1h
+              from the 5m window, without extra upstream requests
+  session   - current: intraday only, bars of the current session (the
+              last one while the market is closed; last 24h for 24/7/FX)
   yahoo_symbol - Optional Yahoo symbol for fallback
+  max_points - Optional cap on returned bars (downsampled server-side)
+  mode      - candle (default; bars merged into OHLC buckets) | line (LTTB
+              picks bars that keep the shape of the close line)
+  format    - json (default, list of bar dicts) | columnar (one array per
+              field) | f32 (packed int32/float32 columns, base64; add
+              binary=1 for raw application/octet-stream)
+  debug     - timing to include the per-upstream-call breakdown (_timing)
 """
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import time
-import urllib.request
+import sys
 import urllib.parse
 import urllib.error
-import http.cookiejar
-import re
-from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _timing as timing  # noqa: E402
+import _calendar as calendar  # noqa: E402
+import _chart as chart_data  # noqa: E402
+import _columns as columns  # noqa: E402
 
-EODHD_API_KEY = os.environ.get('EODHD_API_KEY', '')
-
-
-# ─── EODHD helpers ───────────────────────────────────────────────
-
-def fetch_eodhd_intraday(symbol):
-    """Fetch intraday 5-minute bars from EODHD.
-    
-    Uses 'from' param (unix timestamp) to limit to last ~2 days of data,
-    keeping the response small. Frontend filters to last trading day.
-    """
-    from_ts = int(time.time()) - 2 * 86400  # last 2 days
-    url = (
-        f"https://eodhd.com/api/intraday/{urllib.parse.quote(symbol, safe='')}"
-        f"?api_token={EODHD_API_KEY}&interval=5m&fmt=json&from={from_ts}"
-    )
-    req = urllib.request.Request(url, headers={'User-Agent': 'MarketDashboard/1.0'})
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        raw = json.loads(resp.read())
-
-    if not raw or not isinstance(raw, list):
-        return []
-
-    ohlcv = []
-    for bar in raw:
-        close = bar.get('close')
-        if close is None or close == 'NA':
-            continue
-        ohlcv.append({
-            'time': int(bar['timestamp']),
-            'open': float(bar.get('open') or close),
-            'high': float(bar.get('high') or close),
-            'low': float(bar.get('low') or close),
-            'close': float(close),
-            'volume': int(bar.get('volume') or 0)
-        })
-    return ohlcv
-
-
-def fetch_eodhd_eod(symbol, from_date):
-    """Fetch daily OHLCV bars from EODHD EOD API.
-    
-    Returns date strings (YYYY-MM-DD) as time values for BusinessDay format.
-    This eliminates timezone-related date offset issues in daily charts.
-    
-    Args:
-        symbol: EODHD symbol (e.g. GLD.US)
-        from_date: ISO date string YYYY-MM-DD
-    """
-    url = (
-        f"https://eodhd.com/api/eod/{urllib.parse.quote(symbol, safe='')}"
-        f"?api_token={EODHD_API_KEY}&fmt=json&from={from_date}"
-    )
-    req = urllib.request.Request(url, headers={'User-Agent': 'MarketDashboard/1.0'})
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        raw = json.loads(resp.read())
-
-    if not raw or not isinstance(raw, list):
-        return []
-
-    ohlcv = []
-    for bar in raw:
-        close = bar.get('close')
-        if close is None or close == 'NA':
-            continue
-        date_str = bar.get('date', '')
-        if not date_str:
-            continue
-        # Validate date format
-        try:
-            datetime.strptime(date_str, '%Y-%m-%d')
-        except ValueError:
-            continue
-        ohlcv.append({
-            'time': date_str,
-            'open': float(bar.get('open') or close),
-            'high': float(bar.get('high') or close),
-            'low': float(bar.get('low') or close),
-            'close': float(close),
-            'volume': int(bar.get('volume') or 0)
-        })
-    return ohlcv
-
-
-def range_to_from_date(range_val):
-    """Convert a range string to a 'from' date for EODHD EOD API."""
-    now = datetime.utcnow()
-    if range_val == '5d':
-        delta = timedelta(days=10)  # extra buffer for weekends
-    elif range_val in ('1mo', '1m'):
-        delta = timedelta(days=35)
-    elif range_val == '3mo':
-        delta = timedelta(days=95)
-    elif range_val == '6mo':
-        delta = timedelta(days=185)
-    elif range_val == '1y':
-        delta = timedelta(days=370)
-    elif range_val == '2y':
-        delta = timedelta(days=740)
-    else:
-        delta = timedelta(days=95)
-    return (now - delta).strftime('%Y-%m-%d')
-
-
-
-# ─── HKMA HIBOR helpers ─────────────────────────────────────────
-
-def fetch_hkma_hibor_chart(symbol, range_val):
-    """Fetch HKMA HIBOR fixing history as daily OHLC rows.
-
-    HIBOR is a rate fixing, not a traded instrument, so OHLC are all set to the
-    same daily fixing value. The frontend can still render it as a time series.
-    """
-    tenor_map = {
-        'HIBORON': 'ir_overnight',
-        'HIBOR1W': 'ir_1w',
-        'HIBOR1M': 'ir_1m',
-        'HIBOR3M': 'ir_3m',
-        'HIBOR6M': 'ir_6m',
-        'HIBOR12M': 'ir_12m',
-    }
-    tenor = tenor_map.get(symbol, 'ir_1m')
-    hkab_maturity_map = {
-        'HIBORON': 'Overnight',
-        'HIBOR1W': '1 Week',
-        'HIBOR1M': '1 Month',
-        'HIBOR3M': '3 Months',
-        'HIBOR6M': '6 Months',
-        'HIBOR12M': '12 Months',
-    }
-    url = (
-        'https://api.hkma.gov.hk/public/market-data-and-statistics/'
-        'monthly-statistical-bulletin/er-ir/hk-interbank-ir-daily'
-        '?segment=hibor.fixing&offset=0'
-    )
-    try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'MarketDashboard/1.0'})
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            raw = json.loads(resp.read())
-
-        records = raw.get('result', {}).get('records', [])
-        records = [r for r in records if r.get(tenor) not in (None, 'NA') and r.get('end_of_day')]
-        if records:
-            records = sorted(records, key=lambda r: r['end_of_day'])
-            latest_date = datetime.strptime(records[-1]['end_of_day'], '%Y-%m-%d').date()
-            if (datetime.utcnow().date() - latest_date).days <= 7:
-                range_limits = {
-                    '5d': 5,
-                    '1w': 7,
-                    '1mo': 23,
-                    '1m': 23,
-                    '3mo': 66,
-                    '6mo': 132,
-                    '1y': 252,
-                }
-                limit = range_limits.get(range_val, 66)
-                rows = []
-                for r in records[-limit:]:
-                    close = float(r[tenor])
-                    rows.append({
-                        'time': r['end_of_day'],
-                        'open': close,
-                        'high': close,
-                        'low': close,
-                        'close': close,
-                        'volume': 0
-                    })
-                return rows
-    except Exception:
-        pass
-
-    return fetch_hkab_hibor_chart(symbol, hkab_maturity_map.get(symbol, '1 Month'))
-
-
-def fetch_hkab_hibor_chart(symbol, maturity):
-    """Return a single latest HIBOR fixing row from HKAB as chart fallback."""
-    url = 'https://www.hkab.org.hk/en/rates/hibor'
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'Mozilla/5.0 MarketDashboard/1.0',
-        'Accept-Language': 'en-US,en;q=0.9',
-    })
-    last_error = None
-    html = None
-    for _ in range(3):
-        try:
-            with urllib.request.urlopen(req, timeout=12) as resp:
-                html = resp.read().decode('utf-8', 'replace')
-            break
-        except Exception as exc:
-            last_error = exc
-    if html is None:
-        raise last_error
-
-    date_match = re.search(r'Rates as at 11:15a\.m\.<br/>Hong Kong Time on (\d{4})-(\d{1,2})-(\d{1,2})\.', html)
-    as_of_date = datetime.utcnow().strftime('%Y-%m-%d')
-    if date_match:
-        y, m, d = map(int, date_match.groups())
-        as_of_date = f'{y:04d}-{m:02d}-{d:02d}'
-
-    pattern = (
-        r'<div class="general_table_cell hibor_maturity"><div>' + re.escape(maturity) +
-        r'</div></div><div class="general_table_cell last"><div>([0-9.]+)</div></div>'
-    )
-    rate_match = re.search(pattern, html)
-    if not rate_match:
-        return []
-    close = float(rate_match.group(1))
-    return [{
-        'time': as_of_date,
-        'open': close,
-        'high': close,
-        'low': close,
-        'close': close,
-        'volume': 0
-    }]
-
-# ─── Yahoo fallback ──────────────────────────────────────────────
-
-def fetch_yahoo_chart(symbol, range_val, interval):
-    """Fallback: fetch chart data from Yahoo Finance.
-    
-    For daily interval, returns date strings (YYYY-MM-DD) as time values.
-    For intraday interval, returns Unix timestamps.
-    """
-    crumb, cj, opener = _get_yahoo_crumb()
-    yahoo_url = (
-        f"https://query2.finance.yahoo.com/v8/finance/chart/{urllib.parse.quote(symbol)}"
-        f"?range={range_val}&interval={interval}&crumb={urllib.parse.quote(crumb)}"
-    )
-    req = urllib.request.Request(yahoo_url, headers={
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    })
-    with opener.open(req, timeout=6) as resp:
-        yahoo_data = json.loads(resp.read())
-
-    chart_result = yahoo_data.get('chart', {}).get('result', [])
-    if not chart_result:
-        return []
-
-    data = chart_result[0]
-    timestamps = data.get('timestamp') or []
-    quote = data.get('indicators', {}).get('quote', [{}])[0]
-    opens = quote.get('open', [])
-    highs = quote.get('high', [])
-    lows = quote.get('low', [])
-    closes = quote.get('close', [])
-    volumes = quote.get('volume', [])
-
-    use_date_strings = (interval == '1d')
-
-    ohlcv = []
-    for i in range(len(timestamps)):
-        if i < len(closes) and closes[i] is not None:
-            ts = timestamps[i]
-            if use_date_strings:
-                # Convert Unix timestamp to UTC date string
-                # Yahoo daily timestamps are at market close or midnight UTC
-                time_val = datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d')
-            else:
-                time_val = ts
-            ohlcv.append({
-                'time': time_val,
-                'open': opens[i] if i < len(opens) and opens[i] else closes[i],
-                'high': highs[i] if i < len(highs) and highs[i] else closes[i],
-                'low': lows[i] if i < len(lows) and lows[i] else closes[i],
-                'close': closes[i],
-                'volume': volumes[i] if i < len(volumes) and volumes[i] else 0
-            })
-    return ohlcv
-
-
-def _get_yahoo_crumb():
-    """Get Yahoo Finance crumb and cookies for authenticated API access."""
-    cj = http.cookiejar.CookieJar()
-    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cj))
-    opener.addheaders = [('User-Agent', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36')]
-    opener.open('https://fc.yahoo.com', timeout=3)
-    crumb_req = urllib.request.Request('https://query2.finance.yahoo.com/v1/test/getcrumb')
-    crumb_req.add_header('User-Agent', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36')
-    with opener.open(crumb_req, timeout=3) as resp:
-        crumb = resp.read().decode('utf-8')
-    return crumb, cj, opener
-
-
-# ─── Main handler ────────────────────────────────────────────────
 
 class handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
+        self.timings = timing.start()
+        self.debug_timing = False
+        self.max_age = 30
         try:
             parsed = urllib.parse.urlparse(self.path)
             params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
             symbol = params.get('symbol', [''])[0]
             range_val = params.get('range', ['3mo'])[0]
             interval = params.get('interval', ['1d'])[0]
@@ -323,106 +56,53 @@ class handler(BaseHTTPRequestHandler):
             if not symbol:
                 self._respond(400, {'error': 'Missing symbol parameter'})
                 return
+            timing.set_symbol(symbol)
 
-            ohlcv = []
-            source_used = 'none'
-
-            # ── HKMA HIBOR synthetic symbols ──
-            if symbol.startswith('HIBOR'):
-                try:
-                    ohlcv = fetch_hkma_hibor_chart(symbol, range_val)
-                    source_used = 'hkma_hibor_or_hkab_fallback'
-                except Exception:
-                    ohlcv = []
-
-            # ── Try EODHD first ──
-            if not ohlcv and EODHD_API_KEY:
-                try:
-                    if interval == '5m':
-                        ohlcv = fetch_eodhd_intraday(symbol)
-                        source_used = 'eodhd_intraday'
-                    else:
-                        from_date = range_to_from_date(range_val)
-                        ohlcv = fetch_eodhd_eod(symbol, from_date)
-                        source_used = 'eodhd_eod'
-                except Exception:
-                    ohlcv = []
-
-            # ── Fallback to Yahoo ──
-            if not ohlcv:
-                fallback_sym = yahoo_symbol or symbol
-                try:
-                    yahoo_range = range_val
-                    if range_val == '3mo':
-                        yahoo_range = '3mo'
-                    elif range_val == '1y':
-                        yahoo_range = '1y'
+            try:
+                view = chart_data.parse_view(params)
+            except ValueError as e:
+                self._respond(400, {'error': str(e)})
+                return
+            binary = view.format == 'f32' and params.get('binary', [''])[0] == '1'
 
-                    ohlcv = fetch_yahoo_chart(fallback_sym, yahoo_range, interval)
-                    source_used = 'yahoo'
-                except Exception:
-                    pass
+            chart = chart_data.load_chart(symbol, range_val, interval, yahoo_symbol or None)
+            ohlcv = chart.data
 
-            # ── Fallback: unauthenticated Yahoo ──
-            if not ohlcv and (yahoo_symbol or symbol):
-                fallback_sym = yahoo_symbol or symbol
-                try:
-                    yahoo_url = (
-                        f"https://query2.finance.yahoo.com/v8/finance/chart/"
-                        f"{urllib.parse.quote(fallback_sym)}"
-                        f"?range={range_val}&interval={interval}"
-                    )
-                    req = urllib.request.Request(yahoo_url, headers={
-                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                    })
-                    with urllib.request.urlopen(req, timeout=8) as resp:
-                        yahoo_data = json.loads(resp.read())
-                    chart_result = yahoo_data.get('chart', {}).get('result', [])
-                    use_date_strings = (interval == '1d')
-                    if chart_result:
-                        data = chart_result[0]
-                        timestamps = data.get('timestamp') or []
-                        quote = data.get('indicators', {}).get('quote', [{}])[0]
-                        closes = quote.get('close', [])
-                        opens = quote.get('open', [])
-                        highs = quote.get('high', [])
-                        lows = quote.get('low', [])
-                        volumes = quote.get('volume', [])
-                        for i in range(len(timestamps)):
-                            if i < len(closes) and closes[i] is not None:
-                                ts = timestamps[i]
-                                if use_date_strings:
-                                    time_val = datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d')
-                                else:
-                                    time_val = ts
-                                ohlcv.append({
-                                    'time': time_val,
-                                    'open': opens[i] if i < len(opens) and opens[i] else closes[i],
-                                    'high': highs[i] if i < len(highs) and highs[i] else closes[i],
-                                    'low': lows[i] if i < len(lows) and lows[i] else closes[i],
-                                    'close': closes[i],
-                                    'volume': volumes[i] if i < len(volumes) and volumes[i] else 0
-                                })
-                        source_used = 'yahoo_unauth'
-                except Exception:
-                    pass
+            breakers = chart_data.SOURCE_HEALTH.snapshot([symbol])
 
             if not ohlcv:
-                self._respond(404, {'error': 'No data from any source', 'symbol': symbol})
+                response = {'error': 'No data from any source', 'symbol': symbol}
+                if breakers:
+                    response['breakers'] = breakers
+                self._respond(404, response)
                 return
 
-            # Determine time_format based on interval
-            # Daily data uses date strings, intraday uses Unix timestamps
-            time_format = 'date' if interval == '1d' else 'timestamp'
+            ohlcv, downsampled = chart_data.apply_view(chart, view)
 
-            self._respond(200, {
+            payload = {
                 'symbol': symbol,
                 'range': range_val,
                 'interval': interval,
-                'source': source_used,
-                'time_format': time_format,
+                'source': chart.source,
+                'time_format': chart.time_format,
                 'data': ohlcv
-            })
+            }
+            if downsampled:
+                payload['downsampled'] = downsampled
+            if breakers:
+                payload['breakers'] = breakers
+            # Bars cannot change while the market is closed, provided they
+            # were fetched after the close (not cached ones a refresh missed)
+            if chart_data.settled(chart):
+                self.max_age = calendar.closed_max_age([chart.session], 30)
+            if binary:
+                self._respond_binary(columns.pack_f32(ohlcv), {
+                    'X-Chart-Length': len(ohlcv),
+                    'X-Chart-Source': chart.source,
+                    'X-Chart-Time-Format': chart.time_format,
+                })
+                return
+            self._respond(200, columns.encode(payload, view.format))
 
         except urllib.error.URLError:
             self._respond(504, {'error': 'timeout'})
@@ -435,13 +115,29 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = self.timings.to_json()
         self.send_response(code)
         self._cors_headers()
         self.send_header('Content-Type', 'application/json')
-        self.send_header('Cache-Control', 's-maxage=30')
+        self.send_header('Cache-Control', f's-maxage={self.max_age}')
+        self.send_header('Server-Timing', self.timings.server_timing())
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
+    def _respond_binary(self, body, meta):
+        """Raw ``format=f32`` columns; the metadata goes in X-Chart-* headers."""
+        self.send_response(200)
+        self._cors_headers()
+        self.send_header('Access-Control-Expose-Headers', ', '.join(meta))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', f's-maxage={self.max_age}')
+        self.send_header('Server-Timing', self.timings.server_timing())
+        for name, value in meta.items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
     def _cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
@@ -0,0 +1,203 @@
+"""Multi-symbol chart endpoint: history for many assets in one call.
+
+Query params:
+  symbols   - comma-separated symbols (max 40), or
+  set / category - server-side symbol sets as in /api/quotes
+  yahoo_symbols - optional Yahoo symbols, parallel to ``symbols``
+  range, interval, max_points, mode - as /api/chart (applied to every symbol)
+  format    - json | columnar | f32 (base64 per symbol; no binary=1 here)
+  debug     - timing to include the per-upstream-call breakdown (_timing)
+
+Symbols load concurrently through the same code path as /api/chart, sharing
+its connection pool, Yahoo crumb session, daily-bar cache and breakers.
+Duplicate symbols are loaded once, and concurrent loads of one cached
+series share a single upstream request. Symbols still loading when the
+request deadline expires are reported as pending; their bars still land in
+the caches for the next request.
+
+Response: ``{'range', 'interval', 'charts': {symbol: {...}}}`` where each
+entry is the /api/chart payload (``source``, ``time_format``, ``data``...)
+or ``{'error', 'details'}`` for a symbol no source could serve (or still
+pending at the deadline).
+"""
+from http.server import BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.error
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _timing as timing  # noqa: E402
+import _calendar as calendar  # noqa: E402
+import _symbols as symbol_index  # noqa: E402
+import _chart as chart_data  # noqa: E402
+import _columns as columns  # noqa: E402
+
+
+MAX_SYMBOLS = 40
+CHARTS_MAX_WORKERS = 8
+# Same budget as /api/quotes: respond inside Vercel's 10s function limit even
+# when some symbols are stuck in EODHD/Yahoo timeouts
+CHARTS_DEADLINE_SECONDS = float(os.environ.get('CHARTS_DEADLINE_SECONDS', '8'))
+
+
+def _load(symbol, range_val, interval, yahoo_symbol):
+    timing.set_symbol(symbol)
+    return chart_data.load_chart(symbol, range_val, interval, yahoo_symbol)
+
+
+def load_charts(symbols_list, yahoo_map, range_val, interval, deadline_seconds=None):
+    """``{symbol: Chart}`` for ``symbols_list``, loaded concurrently.
+
+    Symbols not finished when the deadline expires get an empty Chart with a
+    pending error instead of holding the response.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = CHARTS_DEADLINE_SECONDS
+    deadline = time.monotonic() + deadline_seconds
+    executor = ThreadPoolExecutor(max_workers=CHARTS_MAX_WORKERS)
+    try:
+        futures = {
+            symbol: timing.submit(executor, _load, symbol, range_val, interval, yahoo_map.get(symbol))
+            for symbol in dict.fromkeys(symbols_list)
+        }
+        wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+    finally:
+        # Do not block the response on stragglers. Queued symbols are not
+        # cancelled: they still run in the background and warm the bar caches.
+        executor.shutdown(wait=False)
+
+    charts = {}
+    for symbol, future in futures.items():
+        if not future.done():
+            charts[symbol] = chart_data.Chart(symbol, [], 'pending', None, None,
+                                              [f"{symbol}: pending (deadline {deadline_seconds:g}s exceeded)"])
+            continue
+        try:
+            charts[symbol] = future.result()
+        except Exception as e:
+            charts[symbol] = chart_data.Chart(symbol, [], 'none', None, None,
+                                              [f"{type(e).__name__}: {e}"])
+    return charts
+
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.timings = timing.start()
+        self.debug_timing = False
+        self.max_age = 30
+        try:
+            parsed = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
+            symbols_str = params.get('symbols', [''])[0]
+            yahoo_symbols_str = params.get('yahoo_symbols', [''])[0]
+            set_name = params.get('set', [''])[0]
+            category = params.get('category', [''])[0]
+            range_val = params.get('range', ['3mo'])[0]
+            interval = params.get('interval', ['1d'])[0]
+
+            if set_name or category:
+                try:
+                    symbols_list = symbol_index.resolve_symbols(set_name, category)
+                except ValueError as e:
+                    self._respond(400, {'error': str(e)})
+                    return
+            else:
+                symbols_list = [s.strip() for s in symbols_str.split(',') if s.strip()]
+
+            if not symbols_list:
+                self._respond(400, {'error': 'Missing symbols parameter'})
+                return
+            if len(set(symbols_list)) > MAX_SYMBOLS:
+                self._respond(400, {'error': f'At most {MAX_SYMBOLS} symbols per request'})
+                return
+
+            try:
+                view = chart_data.parse_view(params)
+            except ValueError as e:
+                self._respond(400, {'error': str(e)})
+                return
+
+            # Explicit yahoo_symbols win, then config routing
+            yahoo_list = [s.strip() for s in yahoo_symbols_str.split(',')]
+            yahoo_map = {}
+            for i, sym in enumerate(symbols_list):
+                route = symbol_index.route_for(sym)
+                if i < len(yahoo_list) and yahoo_list[i]:
+                    yahoo_map[sym] = yahoo_list[i]
+                elif route and route.yahoo_symbol:
+                    yahoo_map[sym] = route.yahoo_symbol
+
+            charts = load_charts(symbols_list, yahoo_map, range_val, interval)
+            breakers = chart_data.SOURCE_HEALTH.snapshot(symbols_list)
+
+            entries = {}
+            sessions = []
+            failed = False
+            # Every served chart fetched after its market's latest close
+            settled = True
+            for symbol, chart in charts.items():
+                if not chart.data:
+                    failed = True
+                    error = 'Pending' if chart.source == 'pending' else 'No data from any source'
+                    entries[symbol] = {'error': error, 'details': chart.errors}
+                    continue
+                ohlcv, downsampled = chart_data.apply_view(chart, view)
+                entry = {
+                    'source': chart.source,
+                    'time_format': chart.time_format,
+                    'data': ohlcv,
+                }
+                if downsampled:
+                    entry['downsampled'] = downsampled
+                entries[symbol] = columns.encode(entry, view.format)
+                sessions.append(chart.session)
+                settled = settled and chart_data.settled(chart)
+
+            payload = {
+                'range': range_val,
+                'interval': interval,
+                'charts': entries,
+            }
+            if breakers:
+                payload['breakers'] = breakers
+            if not sessions:
+                self._respond(502, payload)
+                return
+            # Cacheable until the earliest reopen only if every market is closed
+            # and every symbol was served from bars fetched after the close;
+            # failures and bars a tail refresh missed get the short default
+            if not failed and settled:
+                self.max_age = calendar.closed_max_age(sessions, 30)
+            self._respond(200, payload)
+
+        except urllib.error.URLError:
+            self._respond(504, {'error': 'timeout'})
+        except Exception as e:
+            self._respond(500, {'error': str(e)})
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self._cors_headers()
+        self.end_headers()
+
+    def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = self.timings.to_json()
+        self.send_response(code)
+        self._cors_headers()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', f's-maxage={self.max_age}')
+        self.send_header('Server-Timing', self.timings.server_timing())
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode())
+
+    def _cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
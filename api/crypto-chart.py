@@ -1,20 +1,35 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import urllib.request
+import os
+import sys
 import urllib.parse
+import urllib.error
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _http as http_client  # noqa: E402
+import _timing as timing  # noqa: E402
+import _columns as columns  # noqa: E402
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        self.timings = timing.start()
+        self.debug_timing = False
         try:
             parsed = urllib.parse.urlparse(self.path)
             params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
             symbol = params.get('symbol', [''])[0]
             range_val = params.get('range', ['3mo'])[0]
+            fmt = params.get('format', ['json'])[0]
 
             if not symbol:
                 self._respond(400, {'error': 'Missing symbol parameter'})
                 return
+            if fmt not in columns.FORMATS:
+                self._respond(400, {'error': f"format must be one of {', '.join(columns.FORMATS)}"})
+                return
+            timing.set_symbol(symbol)
 
             # Map range to Binance klines limit
             range_map = {
@@ -28,12 +43,7 @@ class handler(BaseHTTPRequestHandler):
             limit = range_map.get(range_val, 90)
 
             url = f"https://api.binance.com/api/v3/klines?symbol={urllib.parse.quote(symbol)}&interval=1d&limit={limit}"
-            req = urllib.request.Request(url, headers={
-                'User-Agent': 'Mozilla/5.0'
-            })
-
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                klines = json.loads(resp.read())
+            klines = http_client.get_json(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
 
             data = []
             for k in klines:
@@ -46,11 +56,14 @@ class handler(BaseHTTPRequestHandler):
                     'volume': float(k[5])
                 })
 
-            self._respond(200, {
+            if fmt == 'f32' and params.get('binary', [''])[0] == '1':
+                self._respond_binary(columns.pack_f32(data), {'X-Chart-Length': len(data)})
+                return
+            self._respond(200, columns.encode({
                 'symbol': symbol,
                 'range': range_val,
                 'data': data
-            })
+            }, fmt))
 
         except urllib.error.URLError:
             self._respond(504, {'error': 'timeout'})
@@ -63,13 +76,29 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = self.timings.to_json()
         self.send_response(code)
         self._cors_headers()
         self.send_header('Content-Type', 'application/json')
         self.send_header('Cache-Control', 's-maxage=60')
+        self.send_header('Server-Timing', self.timings.server_timing())
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
+    def _respond_binary(self, body, meta):
+        """Raw ``format=f32`` columns; the metadata goes in X-Chart-* headers."""
+        self.send_response(200)
+        self._cors_headers()
+        self.send_header('Access-Control-Expose-Headers', ', '.join(meta))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Cache-Control', 's-maxage=60')
+        self.send_header('Server-Timing', self.timings.server_timing())
+        for name, value in meta.items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
     def _cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
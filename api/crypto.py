@@ -1,42 +1,132 @@
+"""Binance crypto quotes.
+
+Query params:
+  symbols - comma-separated Binance pairs (e.g. BTCUSDT,ETHUSDT)
+  mode    - full (default; 24hr ticker: price, change_pct, prev_close) |
+            price (bookTicker: bid/ask mid price only, a much lighter call)
+  debug   - timing to include the per-upstream-call breakdown (_timing)
+
+All pairs are fetched with one ``symbols=[...]`` call per
+:data:`BINANCE_BATCH_SIZE` pairs. Binance rejects the whole batch if any
+pair is invalid; that chunk is then retried pair by pair so each symbol
+keeps its own result or error. Quotes are cached in-process for a few
+seconds, so concurrent or rapid polls share one upstream call.
+"""
 from http.server import BaseHTTPRequestHandler
 import json
-import urllib.request
+import os
+import sys
 import urllib.parse
+import urllib.error
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _http as http_client  # noqa: E402
+import _timing as timing  # noqa: E402
+from _cache import TTLCache  # noqa: E402
+
+
+BINANCE_API = 'https://api.binance.com/api/v3'
+BINANCE_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+BINANCE_BATCH_SIZE = 100
+# mode -> Binance ticker endpoint
+TICKER_ENDPOINTS = {'full': 'ticker/24hr', 'price': 'ticker/bookTicker'}
+
+TICKER_CACHE = TTLCache(256)
+TICKER_TTL_SECONDS = 5
+
+
+def parse_ticker(mode, data):
+    """One Binance ticker row in the crypto payload shape."""
+    if mode == 'price':
+        bid = float(data.get('bidPrice', 0))
+        ask = float(data.get('askPrice', 0))
+        return {'price': (bid + ask) / 2 if bid and ask else bid or ask, 'bid': bid, 'ask': ask}
+    return {
+        'price': float(data.get('lastPrice', 0)),
+        'change_pct': round(float(data.get('priceChangePercent', 0)), 4),
+        'prev_close': float(data.get('prevClosePrice', 0)),
+        'sparkline': []
+    }
+
+
+def fetch_ticker(mode, symbol):
+    """Ticker for one pair (the per-symbol fallback)."""
+    timing.set_symbol(symbol)
+    url = f"{BINANCE_API}/{TICKER_ENDPOINTS[mode]}?symbol={urllib.parse.quote(symbol)}"
+    data = http_client.get_json(url, headers=BINANCE_HEADERS, timeout=10)
+    return parse_ticker(mode, data)
+
+
+def fetch_ticker_batch(mode, symbols):
+    """``{symbol: quote}`` for ``symbols`` from one ``symbols=[...]`` call."""
+    timing.set_symbol(','.join(symbols))
+    encoded = urllib.parse.quote(json.dumps(symbols, separators=(',', ':')))
+    url = f"{BINANCE_API}/{TICKER_ENDPOINTS[mode]}?symbols={encoded}"
+    rows = http_client.get_json(url, headers=BINANCE_HEADERS, timeout=10)
+    return {row['symbol']: parse_ticker(mode, row) for row in rows if row.get('symbol') in symbols}
+
+
+def get_tickers(mode, symbols):
+    """Quotes or ``{'error'}`` per symbol, from cache or batched calls."""
+    results = {}
+    missing = []
+    for symbol in symbols:
+        cached, _ = TICKER_CACHE.get((mode, symbol))
+        if cached is not None:
+            results[symbol] = cached
+        else:
+            missing.append(symbol)
+
+    for i in range(0, len(missing), BINANCE_BATCH_SIZE):
+        chunk = missing[i:i + BINANCE_BATCH_SIZE]
+        try:
+            quotes = fetch_ticker_batch(mode, chunk)
+        except urllib.error.HTTPError as e:
+            if e.code != 400:
+                for symbol in chunk:
+                    results[symbol] = {'error': str(e)}
+                continue
+            # One invalid pair fails the whole batch: map errors per symbol
+            quotes = {}
+            for symbol in chunk:
+                try:
+                    quotes[symbol] = fetch_ticker(mode, symbol)
+                except Exception as e:
+                    results[symbol] = {'error': str(e)}
+        except Exception as e:
+            for symbol in chunk:
+                results[symbol] = {'error': str(e)}
+            continue
+        for symbol in chunk:
+            if symbol in quotes:
+                TICKER_CACHE.set((mode, symbol), quotes[symbol], TICKER_TTL_SECONDS)
+                results[symbol] = quotes[symbol]
+            elif symbol not in results:
+                results[symbol] = {'error': 'not returned by Binance'}
+
+    return {symbol: results[symbol] for symbol in symbols}
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        self.timings = timing.start()
+        self.debug_timing = False
         try:
             parsed = urllib.parse.urlparse(self.path)
             params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
             symbols = params.get('symbols', [''])[0]
+            mode = params.get('mode', ['full'])[0]
 
             if not symbols:
                 self._respond(400, {'error': 'Missing symbols parameter'})
                 return
+            if mode not in TICKER_ENDPOINTS:
+                self._respond(400, {'error': f"mode must be one of {', '.join(TICKER_ENDPOINTS)}"})
+                return
 
-            symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
-            results = {}
-
-            for symbol in symbol_list:
-                try:
-                    url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={urllib.parse.quote(symbol)}"
-                    req = urllib.request.Request(url, headers={
-                        'User-Agent': 'Mozilla/5.0'
-                    })
-                    with urllib.request.urlopen(req, timeout=10) as resp:
-                        data = json.loads(resp.read())
-                        price = float(data.get('lastPrice', 0))
-                        change_pct = float(data.get('priceChangePercent', 0))
-                        prev_close = float(data.get('prevClosePrice', 0))
-                        results[symbol] = {
-                            'price': price,
-                            'change_pct': round(change_pct, 4),
-                            'prev_close': prev_close,
-                            'sparkline': []
-                        }
-                except Exception as e:
-                    results[symbol] = {'error': str(e)}
+            symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+            results = get_tickers(mode, symbol_list)
 
             self._respond(200, results)
 
@@ -49,10 +139,13 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = self.timings.to_json()
         self.send_response(code)
         self._cors_headers()
         self.send_header('Content-Type', 'application/json')
         self.send_header('Cache-Control', 's-maxage=30')
+        self.send_header('Server-Timing', self.timings.server_timing())
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
@@ -0,0 +1,171 @@
+"""Term-structure (yield curve) endpoint.
+
+GET /api/curve?family=HIBOR&dates=latest,1w,1m
+
+Returns every tenor of the curve for several as-of dates from the shared
+HIBOR table (one cached HKMA download holds all tenors), instead of one
+chart request per tenor.
+
+Query params:
+  family - HIBOR (the only curve family for now)
+  dates  - comma-separated as-of dates (max 10, default latest): latest,
+           a lookback from the latest fixing (5d, 1w, 1m, 3m, 1y...), or
+           YYYY-MM-DD. Each resolves to the last fixing on or before it.
+  debug  - timing to include the per-upstream-call breakdown (_timing)
+
+Response: ``{'family', 'source', 'as_of_date', 'tenors': [{symbol, tenor,
+label, days}], 'curves': {spec: {'date', 'rates': [...]}}}``; ``rates`` is
+parallel to ``tenors`` (None where a tenor has no fixing that day), and a
+spec that cannot be resolved gets ``{'error'}`` instead.
+"""
+from http.server import BaseHTTPRequestHandler
+import bisect
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+import urllib.error
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _timing as timing  # noqa: E402
+import _calendar as calendar  # noqa: E402
+import _hibor as hibor  # noqa: E402
+
+
+MAX_DATES = 10
+DEFAULT_MAX_AGE = 300
+LOOKBACK_PATTERN = re.compile(r'^(\d+)([dwmy])$')
+
+# family -> (fixings loader, [(symbol, tenor, label, days), ...])
+CURVE_FAMILIES = {
+    'HIBOR': (hibor.fixings_by_date, [
+        (symbol, tenor, hibor.HKAB_MATURITY_MAP[tenor], hibor.TENOR_DAYS[tenor])
+        for symbol, tenor in hibor.TENOR_MAP.items()
+    ]),
+}
+
+
+def _months_back(day, months):
+    """``day`` moved back ``months`` calendar months (clamped to month end)."""
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    month += 1
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, min(day.day, (next_month - timedelta(days=1)).day))
+
+
+def target_date(spec, latest):
+    """Calendar date a ``dates`` entry refers to; ValueError if malformed,
+    OverflowError if the lookback is out of the date range."""
+    if spec == 'latest':
+        return latest
+    match = LOOKBACK_PATTERN.match(spec)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == 'd':
+            return latest - timedelta(days=count)
+        if unit == 'w':
+            return latest - timedelta(weeks=count)
+        return _months_back(latest, count * (12 if unit == 'y' else 1))
+    return date.fromisoformat(spec)
+
+
+def build_curves(specs, rows, tenors):
+    """``(as_of_date, {spec: curve})`` from ``{date: {tenor: rate}}``.
+
+    Each spec resolves to the last fixing date on or before its target.
+    """
+    days = sorted(rows)
+    if not days:
+        return None, {}
+    latest = date.fromisoformat(days[-1])
+    curves = {}
+    for spec in specs:
+        try:
+            target = target_date(spec, latest).isoformat()
+        except (ValueError, OverflowError):
+            # Malformed, or a lookback past the start of the calendar
+            curves[spec] = {'error': f'Invalid date: {spec}'}
+            continue
+        index = bisect.bisect_right(days, target) - 1
+        if index < 0:
+            curves[spec] = {'error': f'No fixing on or before {target}'}
+            continue
+        day = days[index]
+        curves[spec] = {
+            'date': day,
+            'rates': [rows[day].get(tenor) for _, tenor, _, _ in tenors],
+        }
+    return days[-1], curves
+
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.timings = timing.start()
+        self.debug_timing = False
+        self.max_age = DEFAULT_MAX_AGE
+        try:
+            parsed = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
+            family = params.get('family', ['HIBOR'])[0].upper()
+            specs = [s.strip() for s in params.get('dates', ['latest'])[0].split(',') if s.strip()]
+
+            if family not in CURVE_FAMILIES:
+                self._respond(400, {'error': f"family must be one of {', '.join(CURVE_FAMILIES)}"})
+                return
+            specs = list(dict.fromkeys(specs)) or ['latest']
+            if len(specs) > MAX_DATES:
+                self._respond(400, {'error': f'At most {MAX_DATES} dates per request'})
+                return
+            timing.set_symbol(family)
+
+            load_fixings, tenors = CURVE_FAMILIES[family]
+            source, rows = load_fixings()
+            as_of_date, curves = build_curves(specs, rows, tenors)
+            if as_of_date is None:
+                self._respond(502, {'error': f'No {family} fixings available', 'family': family})
+                return
+
+            # Nothing changes before the next fixing is published
+            until_fixing = int(hibor.next_fixing_refresh(as_of_date) - time.time())
+            self.max_age = max(DEFAULT_MAX_AGE, min(until_fixing, calendar.CLOSED_MAX_AGE_SECONDS))
+            self._respond(200, {
+                'family': family,
+                'source': source,
+                'as_of_date': as_of_date,
+                'tenors': [
+                    {'symbol': symbol, 'tenor': tenor, 'label': label, 'days': days}
+                    for symbol, tenor, label, days in tenors
+                ],
+                'curves': curves,
+            })
+
+        except urllib.error.URLError:
+            self._respond(504, {'error': 'timeout'})
+        except Exception as e:
+            self._respond(500, {'error': str(e)})
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self._cors_headers()
+        self.end_headers()
+
+    def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = self.timings.to_json()
+        self.send_response(code)
+        self._cors_headers()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', f's-maxage={self.max_age}')
+        self.send_header('Server-Timing', self.timings.server_timing())
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode())
+
+    def _cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
@@ -1,21 +1,75 @@
 """EODHD real-time quotes endpoint for Market Dashboard homepage.
 
 Primary: EODHD real-time API
-Fallback: Yahoo Finance v8 chart API
+Fallback: Yahoo Finance v7 quote API (one batched call), v8 chart per symbol
+
+Query params:
+  set       - Named symbol set from config.json (e.g. all)
+  category  - Comma-separated config.json category ids (e.g. metals,fx)
+  symbols   - Explicit comma-separated symbols (routing looked up in config.json)
+  yahoo_symbols, sources - Optional per-symbol overrides aligned with symbols
+  stream    - 1 to stream NDJSON (one line per symbol as it resolves, then a summary)
+  sparkline - N (2-20) to attach the last N daily closes per symbol (non-stream)
+  debug     - timing to include the per-upstream-call breakdown (_timing)
 """
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import urllib.request
 import urllib.parse
-import urllib.error
 import traceback
-import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _http as http_client  # noqa: E402
+import _hibor as hibor  # noqa: E402
+from _breaker import SourceHealth  # noqa: E402
+import _symbols as symbol_index  # noqa: E402
+from _cache import TTLCache  # noqa: E402
+import _timing as timing  # noqa: E402
+import _calendar as calendar  # noqa: E402
+import _hedge as hedge  # noqa: E402
+import _yahoo as yahoo  # noqa: E402
+import _sparkline as sparkline  # noqa: E402
 
 EODHD_API_KEY = os.environ.get('EODHD_API_KEY', '')
 
+# Per-symbol source chains run on a bounded pool. The deadline keeps one slow
+# fallback (e.g. HKAB's 3x12s retries) from stalling the whole dashboard; it
+# stays under Vercel's 10s function limit so we always get to respond.
+QUOTE_MAX_WORKERS = 8
+QUOTE_DEADLINE_SECONDS = float(os.environ.get('QUOTE_DEADLINE_SECONDS', '8'))
+
+# EODHD real-time accepts extra tickers via `s=`; keep each call well inside
+# the provider's per-request ticker limit.
+EODHD_BATCH_SIZE = 15
+# Race Yahoo against a slow EODHD call once EODHD passes its p90 latency
+# (api/_hedge.py); QUOTE_HEDGING=0 restores the strictly sequential chain.
+QUOTE_HEDGING = os.environ.get('QUOTE_HEDGING', '1') != '0'
+
+# Per-symbol quote cache shared by requests on a warm instance.
+# (ttl, stale) seconds by resolved source: an entry is served directly for
+# `ttl`, then served stale for up to `stale` more while it refreshes.
+QUOTE_CACHE = TTLCache(maxsize=256)
+QUOTE_CACHE_TTL = {
+    'goldprice': (5, 60),
+    'eodhd': (10, 120),
+    'yahoo': (15, 120),
+    'eodhd_eod': (1800, 6 * 3600),
+    # HIBOR rows come from the fixing-aware table in _hibor, so a short TTL
+    # here only costs a dict lookup and picks up the 11:15 HKT fixing promptly.
+    'hkma_hibor': (300, 24 * 3600),
+    'hkab_hibor': (300, 24 * 3600),
+}
+QUOTE_CACHE_TTL_DEFAULT = (10, 60)
+DEFAULT_CACHE_CONTROL = 's-maxage=10, stale-while-revalidate=5'
+
+# Per-(source, symbol) breakers: skip a source that keeps failing for a
+# symbol and go straight to the next one until a half-open probe succeeds.
+SOURCE_HEALTH = SourceHealth()
+
 # ─── GoldPrice.org helpers ───────────────────────────────────────
 
 def fetch_goldprice_data():
@@ -24,11 +78,7 @@ def fetch_goldprice_data():
     Single API call returns both XAU and XAG data.
     """
     url = 'https://data-asg.goldprice.org/dbXRates/USD'
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'MarketDashboard/1.0'
-    })
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        return json.loads(resp.read())
+    return http_client.get_json(url, timeout=10)
 
 
 def parse_goldprice_symbol(data, symbol):
@@ -66,126 +116,16 @@ def fetch_hkma_hibor_latest(symbol):
     """Fetch latest HKMA HIBOR fixing from the official HKMA public API.
 
     Supported synthetic symbols map to HKMA fields, e.g. HIBOR1M -> ir_1m.
-    Returns rates in percent per annum.
-    """
-    tenor_map = {
-        'HIBORON': 'ir_overnight',
-        'HIBOR1W': 'ir_1w',
-        'HIBOR1M': 'ir_1m',
-        'HIBOR3M': 'ir_3m',
-        'HIBOR6M': 'ir_6m',
-        'HIBOR12M': 'ir_12m',
-    }
-    tenor = tenor_map.get(symbol, 'ir_1m')
-    hkab_maturity_map = {
-        'HIBORON': 'Overnight',
-        'HIBOR1W': '1 Week',
-        'HIBOR1M': '1 Month',
-        'HIBOR3M': '3 Months',
-        'HIBOR6M': '6 Months',
-        'HIBOR12M': '12 Months',
-    }
-    url = (
-        'https://api.hkma.gov.hk/public/market-data-and-statistics/'
-        'monthly-statistical-bulletin/er-ir/hk-interbank-ir-daily'
-        '?segment=hibor.fixing&offset=0'
-    )
-    try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'MarketDashboard/1.0'})
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            raw = json.loads(resp.read())
-
-        records = raw.get('result', {}).get('records', [])
-        records = [r for r in records if r.get(tenor) not in (None, 'NA')]
-        if records:
-            records = sorted(records, key=lambda r: r.get('end_of_day', ''))
-            latest = records[-1]
-
-            # HKMA has occasionally returned a stale page or timed out from Vercel.
-            # Prefer the official HKAB fixing page when HKMA is unavailable/stale.
-            latest_date = datetime.strptime(latest.get('end_of_day'), '%Y-%m-%d').date()
-            if (datetime.utcnow().date() - latest_date).days <= 7:
-                prev = records[-2] if len(records) >= 2 else None
-                price = float(latest[tenor])
-                prev_close = float(prev[tenor]) if prev else price
-                change_pct = ((price - prev_close) / prev_close * 100) if prev_close else 0
-
-                return {
-                    'price': price,
-                    'change_pct': round(change_pct, 4),
-                    'prev_close': prev_close,
-                    'sparkline': [float(r[tenor]) for r in records[-7:]],
-                    'source': 'hkma_hibor',
-                    'as_of_date': latest.get('end_of_day')
-                }
-    except Exception:
-        pass
-
-    return fetch_hkab_hibor_latest(symbol, hkab_maturity_map.get(symbol, '1 Month'))
-
-
-def fetch_hkab_hibor_latest(symbol, maturity):
-    """Fetch latest HIBOR fixing from HKAB's official public rates page.
-
-    HKAB is the fixing publisher. This is the production fallback when HKMA's
-    monthly-statistical-bulletin API times out, returns 502, or serves stale rows.
+    Returns rates in percent per annum. All tenors are served from one shared
+    HKMA download (HKAB page as fallback), cached until the next fixing.
     """
-    url = 'https://www.hkab.org.hk/en/rates/hibor'
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'Mozilla/5.0 MarketDashboard/1.0',
-        'Accept-Language': 'en-US,en;q=0.9',
-    })
-    last_error = None
-    html = None
-    for _ in range(3):
-        try:
-            with urllib.request.urlopen(req, timeout=12) as resp:
-                html = resp.read().decode('utf-8', 'replace')
-            break
-        except Exception as exc:
-            last_error = exc
-    if html is None:
-        raise last_error
-
-    date_match = re.search(r'Rates as at 11:15a\.m\.<br/>Hong Kong Time on (\d{4})-(\d{1,2})-(\d{1,2})\.', html)
-    as_of_date = None
-    if date_match:
-        y, m, d = map(int, date_match.groups())
-        as_of_date = f'{y:04d}-{m:02d}-{d:02d}'
-
-    pattern = (
-        r'<div class="general_table_cell hibor_maturity"><div>' + re.escape(maturity) +
-        r'</div></div><div class="general_table_cell last"><div>([0-9.]+)</div></div>'
-    )
-    rate_match = re.search(pattern, html)
-    if not rate_match:
-        raise ValueError(f'HKAB HIBOR rate not found for {maturity}')
-
-    price = float(rate_match.group(1))
-    return {
-        'price': price,
-        'change_pct': 0,
-        'prev_close': price,
-        'sparkline': [price],
-        'source': 'hkab_hibor',
-        'as_of_date': as_of_date
-    }
+    return hibor.hibor_quote(symbol)
 
 # ─── EODHD / Yahoo helpers ──────────────────────────────────────
 
 
-def fetch_eodhd_realtime(symbol):
-    """Fetch real-time quote from EODHD API."""
-    url = (
-        f"https://eodhd.com/api/real-time/{urllib.parse.quote(symbol, safe='')}"
-        f"?api_token={EODHD_API_KEY}&fmt=json"
-    )
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'MarketDashboard/1.0'
-    })
-    with urllib.request.urlopen(req, timeout=8) as resp:
-        data = json.loads(resp.read())
-
+def parse_eodhd_realtime(data):
+    """Normalize one EODHD real-time row into our quote shape."""
     close_price = data.get('close')
     prev_close = data.get('previousClose')
     change_p = data.get('change_p')
@@ -207,6 +147,66 @@ def fetch_eodhd_realtime(symbol):
     }
 
 
+def fetch_eodhd_realtime(symbol):
+    """Fetch real-time quote from EODHD API."""
+    url = (
+        f"https://eodhd.com/api/real-time/{urllib.parse.quote(symbol, safe='')}"
+        f"?api_token={EODHD_API_KEY}&fmt=json"
+    )
+    data = http_client.get_json(url, timeout=8)
+
+    return parse_eodhd_realtime(data)
+
+
+def chunk_symbols(symbols, size=None):
+    """Split symbols into EODHD batch-sized chunks."""
+    size = size or EODHD_BATCH_SIZE
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+def fetch_eodhd_realtime_rows(symbols, api_key=None, timeout=8):
+    """Fetch raw real-time rows for several symbols in one EODHD call.
+
+    The first symbol goes in the path and the rest in ``s=``. EODHD answers
+    with a list (or a bare object for a single symbol) keyed by ``code``.
+    Returns ``{symbol: row}``; symbols missing from the response are left
+    out so the caller can retry them one by one. Also used by
+    scripts/fetch_prices.py, which passes its own ``api_key``.
+    """
+    if not symbols:
+        return {}
+    timing.set_symbol(','.join(symbols))
+    url = (
+        f"https://eodhd.com/api/real-time/{urllib.parse.quote(symbols[0], safe='')}"
+        f"?api_token={api_key or EODHD_API_KEY}&fmt=json"
+    )
+    if len(symbols) > 1:
+        url += '&s=' + ','.join(urllib.parse.quote(s, safe='') for s in symbols[1:])
+    raw = http_client.get_json(url, timeout=timeout)
+
+    rows = raw if isinstance(raw, list) else [raw]
+    wanted = {s.upper(): s for s in symbols}
+    results = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        sym = wanted.get(str(row.get('code', '')).upper())
+        if sym:
+            results[sym] = row
+    return results
+
+
+def fetch_eodhd_realtime_batch(symbols):
+    """Fetch real-time quotes for several symbols in one EODHD call.
+
+    Returns ``{symbol: quote}``. Symbols EODHD reported as NA map to None
+    (a per-symbol retry would say the same); symbols missing from the
+    response are left out so the caller can retry them one by one.
+    """
+    rows = fetch_eodhd_realtime_rows(symbols)
+    return {sym: parse_eodhd_realtime(row) for sym, row in rows.items()}
+
+
 def fetch_eodhd_eod_latest(symbol):
     """Fetch the latest daily close from EODHD EOD API.
 
@@ -219,11 +219,7 @@ def fetch_eodhd_eod_latest(symbol):
         f"https://eodhd.com/api/eod/{urllib.parse.quote(symbol, safe='')}"
         f"?api_token={EODHD_API_KEY}&fmt=json&from={from_date}"
     )
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'MarketDashboard/1.0'
-    })
-    with urllib.request.urlopen(req, timeout=8) as resp:
-        raw = json.loads(resp.read())
+    raw = http_client.get_json(url, timeout=8)
 
     if not raw or not isinstance(raw, list):
         return None
@@ -255,11 +251,7 @@ def fetch_yahoo_realtime(symbol):
         f"https://query1.finance.yahoo.com/v8/finance/chart/{encoded}"
         f"?range=5d&interval=1d&includePrePost=false"
     )
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    })
-    with urllib.request.urlopen(req, timeout=8) as resp:
-        data = json.loads(resp.read())
+    data = yahoo.SESSION.get_json(url, timeout=8)
 
     chart_result = data.get('chart', {}).get('result', [])
     if not chart_result:
@@ -297,108 +289,435 @@ def fetch_yahoo_realtime(symbol):
     }
 
 
+def uses_eodhd_realtime(source):
+    """Whether a symbol's primary route is the EODHD real-time endpoint."""
+    return source not in ('goldprice', 'hkma_hibor', 'eodhd_eod', 'yahoo')
+
+
+def _eodhd_eod_step(sym, skipped):
+    """EODHD daily close for symbols without reliable real-time quotes."""
+    data, error = SOURCE_HEALTH.call('eodhd_eod', sym, fetch_eodhd_eod_latest, sym, skipped=skipped)
+    if error:
+        return data, [f"{sym}: EODHD EOD error: {str(error)}"]
+    return data, []
+
+
+def _eodhd_realtime_step(sym, eodhd_future, skipped):
+    """EODHD real-time: the batched result first; only symbols the batch
+    missed pay their own call. If the batch call itself failed, EODHD is
+    not retried per symbol and the chain moves on to Yahoo."""
+    errors = []
+    batch = {}
+    if eodhd_future is not None:
+        try:
+            batch = eodhd_future.result()
+        except Exception as e:
+            # The provider just failed: a per-symbol call each would only
+            # pile onto it, so count the failure and fall through
+            SOURCE_HEALTH.record_failure('eodhd', sym, str(e))
+            errors.append(f"{sym}: EODHD batch error: {str(e)}")
+            return None, errors
+    if sym in batch:
+        if batch[sym]:
+            SOURCE_HEALTH.record_success('eodhd', sym)
+            return batch[sym], errors
+        SOURCE_HEALTH.record_failure('eodhd', sym, 'NA', definitive=True)
+        return None, errors
+    data, error = SOURCE_HEALTH.call('eodhd', sym, fetch_eodhd_realtime, sym, skipped=skipped)
+    if error:
+        errors.append(f"{sym}: EODHD error: {str(error)}")
+    return data, errors
+
+
+def fetch_yahoo_quote(symbol, yahoo_batch=None):
+    """Yahoo quote from the request's shared v7 batch; the per-symbol v8
+    chart call only runs for symbols the batch omitted (or if it failed)."""
+    if yahoo_batch is not None:
+        data = yahoo_batch.get(symbol)
+        if data:
+            return data
+    return fetch_yahoo_realtime(symbol)
+
+
+def _yahoo_step(sym, yahoo_sym, skipped, yahoo_batch=None):
+    data, error = SOURCE_HEALTH.call('yahoo', sym, fetch_yahoo_quote, yahoo_sym, yahoo_batch, skipped=skipped)
+    if error:
+        return data, [f"{sym}: Yahoo fallback error ({yahoo_sym}): {str(error)}"]
+    return data, []
+
+
+def resolve_quote(sym, source, yahoo_sym, goldprice_future=None, eodhd_future=None, yahoo_batch=None):
+    """Run the source chain for one symbol.
+
+    Returns ``(data, errors)`` where ``data`` is the first usable quote (or
+    None) and ``errors`` lists every failure hit along the way. Sources whose
+    circuit breaker is open for this symbol are skipped.
+    """
+    timing.set_symbol(sym)
+    errors = []
+    skipped = []
+
+    # Try goldprice for precious metals
+    if source == 'goldprice':
+        try:
+            if goldprice_future is not None:
+                goldprice_raw = goldprice_future.result()
+            else:
+                goldprice_raw = fetch_goldprice_data()
+        except Exception as e:
+            # A shared prefetch failure is reported once by resolve_quotes
+            if goldprice_future is None:
+                errors.append(f"{sym}: goldprice API error: {str(e)}")
+            goldprice_raw = None
+        if goldprice_raw:
+            try:
+                data = parse_goldprice_symbol(goldprice_raw, sym)
+                if data:
+                    return data, errors
+            except Exception as e:
+                errors.append(f"{sym}: goldprice parse error: {str(e)}")
+
+    # Try HKMA HIBOR for Hong Kong interbank offered rates
+    if source == 'hkma_hibor':
+        try:
+            data = fetch_hkma_hibor_latest(sym)
+            if data:
+                return data, errors
+        except Exception as e:
+            errors.append(f"{sym}: HKMA HIBOR error: {str(e)}")
+
+    # EODHD (daily close for eodhd_eod, real-time otherwise) with the Yahoo
+    # fallback. Yahoo-configured futures (CL=F/BZ=F/HG=F) should not pay an
+    # EODHD 422 round trip before using their intended source.
+    primary = None
+    record_primary = True
+    if source == 'eodhd_eod' and EODHD_API_KEY:
+        primary = ('eodhd_eod', lambda: _eodhd_eod_step(sym, skipped))
+    elif source != 'yahoo' and EODHD_API_KEY:
+        primary = (
+            'eodhd_batch' if eodhd_future is not None else 'eodhd',
+            lambda: _eodhd_realtime_step(sym, eodhd_future, skipped),
+        )
+        # Batch latency is recorded once per chunk by iter_resolved
+        record_primary = eodhd_future is None
+    fallback = ('yahoo', lambda: _yahoo_step(sym, yahoo_sym, skipped, yahoo_batch))
+
+    if primary and QUOTE_HEDGING:
+        data, _, step_errors = hedge.race(primary, fallback, record_primary=record_primary)
+        errors.extend(step_errors)
+        if data:
+            return data, errors
+    else:
+        for _, step in filter(None, (primary, fallback)):
+            data, step_errors = step()
+            errors.extend(step_errors)
+            if data:
+                return data, errors
+
+    if skipped:
+        errors.append(f"{sym}: all sources failed (circuit open: {', '.join(skipped)})")
+    else:
+        errors.append(f"{sym}: all sources failed")
+    return None, errors
+
+
+def quote_cache_key(sym, source, yahoo_sym):
+    return (sym, source, yahoo_sym)
+
+
+def cache_quote(key, data):
+    ttl, stale = QUOTE_CACHE_TTL.get(data.get('source'), QUOTE_CACHE_TTL_DEFAULT)
+    sym, _, yahoo_sym = key
+    # Fetched after the close: the price is final until the market reopens
+    ttl = max(ttl, calendar.seconds_until_open(symbol_index.session_for(sym, yahoo_sym)))
+    QUOTE_CACHE.set(key, data, ttl, stale)
+
+
+def cache_control(symbols_list, yahoo_map, errors=None):
+    """Cache-Control for a quotes response: until the next open if every
+    requested market is closed, the short default otherwise (or on errors)."""
+    if errors:
+        return DEFAULT_CACHE_CONTROL
+    max_age = calendar.closed_max_age(
+        [symbol_index.session_for(sym, yahoo_map.get(sym, sym)) for sym in symbols_list], 10
+    )
+    return f's-maxage={max_age}, stale-while-revalidate=5'
+
+
+def iter_resolved(symbols_list, source_map, yahoo_map, deadline_seconds=None):
+    """Resolve every symbol's source chain concurrently, yielding as each finishes.
+
+    Yields ``(sym, data, errors)`` in completion order. Symbols still running
+    (or queued) when the deadline expires are yielded as pending (``data``
+    None) instead of holding the caller; their results still land in the
+    cache when they finish, so the next request can serve them. A shared
+    goldprice failure is yielded once as ``(None, None, [error])``.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = QUOTE_DEADLINE_SECONDS
+    deadline = time.monotonic() + deadline_seconds
+    executor = ThreadPoolExecutor(max_workers=QUOTE_MAX_WORKERS)
+    futures = {}
+    goldprice_future = None
+    done = set()
+    try:
+        # Pre-fetch goldprice data if any symbols need it (single API call).
+        # Shared fetches are submitted before the per-symbol chains so they
+        # are already running when the chains that wait on them start.
+        if any(source_map.get(s) == 'goldprice' for s in symbols_list):
+            goldprice_future = timing.submit(executor, fetch_goldprice_data)
+
+        # Group EODHD-routed symbols into multi-symbol real-time calls.
+        eodhd_futures = {}
+        if EODHD_API_KEY:
+            eodhd_syms = list(dict.fromkeys(
+                s for s in symbols_list
+                if uses_eodhd_realtime(source_map.get(s, '')) and SOURCE_HEALTH.allow('eodhd', s)
+            ))
+            for chunk in chunk_symbols(eodhd_syms):
+                chunk_future = timing.submit(executor, fetch_eodhd_realtime_batch, chunk)
+                chunk_future.add_done_callback(_record_batch_latency(time.monotonic()))
+                for sym in chunk:
+                    eodhd_futures[sym] = chunk_future
+
+        # Every symbol with Yahoo in its chain shares one lazy v7 quote call:
+        # it fires on the first Yahoo lookup and serves all later ones.
+        yahoo_batch = yahoo.QuoteBatch([
+            yahoo_map.get(s, s) for s in symbols_list if source_map.get(s) != 'hkma_hibor'
+        ])
+
+        for sym in symbols_list:
+            if sym in futures:
+                continue
+            source = source_map.get(sym, '')
+            yahoo_sym = yahoo_map.get(sym, sym)
+            future = timing.submit(
+                executor, resolve_quote, sym, source, yahoo_sym,
+                goldprice_future, eodhd_futures.get(sym), yahoo_batch
+            )
+            future.add_done_callback(_cache_on_done(quote_cache_key(sym, source, yahoo_sym)))
+            futures[sym] = future
+
+        sym_by_future = {future: sym for sym, future in futures.items()}
+        try:
+            for future in as_completed(sym_by_future, timeout=max(0, deadline - time.monotonic())):
+                sym = sym_by_future[future]
+                done.add(sym)
+                try:
+                    data, sym_errors = future.result()
+                except Exception as e:
+                    data, sym_errors = None, [f"{sym}: {type(e).__name__}: {str(e)}"]
+                yield sym, data, sym_errors
+        except FuturesTimeout:
+            pass
+    finally:
+        # Do not block the response on stragglers. Queued symbols are not
+        # cancelled: they still run in the background and warm the quote cache.
+        executor.shutdown(wait=False)
+
+    if goldprice_future is not None and goldprice_future.done() and not goldprice_future.cancelled():
+        exc = goldprice_future.exception()
+        if exc is not None:
+            yield None, None, [f"goldprice API error: {str(exc)}"]
+
+    for sym in futures:
+        if sym not in done:
+            yield sym, None, [f"{sym}: pending (deadline {deadline_seconds:.3g}s exceeded)"]
+
+
+def resolve_quotes(symbols_list, source_map, yahoo_map, deadline_seconds=None):
+    """Collect :func:`iter_resolved` into ``(result, errors)``."""
+    result = {}
+    errors = []
+    for sym, data, sym_errors in iter_resolved(symbols_list, source_map, yahoo_map, deadline_seconds):
+        errors.extend(sym_errors)
+        if data:
+            result[sym] = data
+    return result, errors
+
+
+def _record_batch_latency(started):
+    def callback(future):
+        if not future.cancelled():
+            hedge.LATENCY.record('eodhd_batch', time.monotonic() - started)
+    return callback
+
+
+def _cache_on_done(key):
+    def callback(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        data, _ = future.result()
+        if data:
+            cache_quote(key, data)
+    return callback
+
+
+def iter_quotes(symbols_list, source_map, yahoo_map, deadline_seconds=None):
+    """Yield ``(sym, data, errors)``, cache hits first, then fetched symbols.
+
+    Fresh cache entries are yielded as-is. Stale entries are yielded
+    immediately and refreshed in the background (stale-while-revalidate);
+    misses go through :func:`iter_resolved` as they complete.
+    """
+    stale = []
+    missing = []
+    for sym in dict.fromkeys(symbols_list):
+        source = source_map.get(sym, '')
+        key = quote_cache_key(sym, source, yahoo_map.get(sym, sym))
+        data, state = QUOTE_CACHE.get(key)
+        if data is None:
+            missing.append(sym)
+            continue
+        if state == 'stale':
+            stale.append(key)
+        yield sym, data, []
+
+    if stale:
+        QUOTE_CACHE.revalidate(stale, _refresh_quotes)
+
+    if missing:
+        yield from iter_resolved(missing, source_map, yahoo_map, deadline_seconds)
+
+
+def get_quotes(symbols_list, source_map, yahoo_map, deadline_seconds=None):
+    """Serve quotes through the cache; returns ``(result, errors)`` in request order."""
+    found = {}
+    errors = []
+    for sym, data, sym_errors in iter_quotes(symbols_list, source_map, yahoo_map, deadline_seconds):
+        errors.extend(sym_errors)
+        if data:
+            found[sym] = data
+
+    # Keep the caller's symbol order in the response
+    result = {sym: found[sym] for sym in symbols_list if sym in found}
+    return result, errors
+
+
+def spark_sessions(symbols_list, source_map, yahoo_map):
+    """``{yahoo_symbol: session}`` for the symbols whose sparkline comes from
+    the shared daily-close cache (HIBOR carries its own fixings)."""
+    return {
+        yahoo_map.get(sym, sym): symbol_index.session_for(sym, yahoo_map.get(sym, sym))
+        for sym in symbols_list if source_map.get(sym) != 'hkma_hibor'
+    }
+
+
+def attach_sparklines(result, yahoo_map, spark_future, n, timeout):
+    """Copies of the quotes in ``result`` with their last ``n`` daily closes.
+
+    Waits at most ``timeout`` seconds (what is left of the request deadline)
+    for the series. Quote dicts may be shared with QUOTE_CACHE, so they are
+    never mutated. Symbols without a cached series keep their own (trimmed)
+    sparkline.
+    """
+    try:
+        series = spark_future.result(timeout=timeout)
+    except Exception:
+        series = {}
+    out = {}
+    for sym, data in result.items():
+        closes = series.get(yahoo_map.get(sym, sym))
+        if closes:
+            out[sym] = dict(data, sparkline=sparkline.sparkline(closes, n))
+        else:
+            out[sym] = dict(data, sparkline=list(data.get('sparkline') or [])[-n:])
+    return out
+
+
+def _refresh_quotes(keys):
+    """Background revalidation for stale cache keys (results cached on completion)."""
+    symbols_list = [sym for sym, _, _ in keys]
+    source_map = {sym: source for sym, source, _ in keys}
+    yahoo_map = {sym: yahoo_sym for sym, _, yahoo_sym in keys}
+    resolve_quotes(symbols_list, source_map, yahoo_map)
+
+
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        self.timings = timing.start()
+        deadline = time.monotonic() + QUOTE_DEADLINE_SECONDS
+        self.debug_timing = False
+        self.cache_control = DEFAULT_CACHE_CONTROL
         try:
             parsed = urllib.parse.urlparse(self.path)
             params = urllib.parse.parse_qs(parsed.query)
+            self.debug_timing = params.get('debug', [''])[0] == 'timing'
             symbols_str = params.get('symbols', [''])[0]
             yahoo_symbols_str = params.get('yahoo_symbols', [''])[0]
             sources_str = params.get('sources', [''])[0]
+            set_name = params.get('set', [''])[0]
+            category = params.get('category', [''])[0]
+
+            # Server-side sets (?set=all, ?category=metals) resolve from config.json
+            if set_name or category:
+                try:
+                    symbols_list = symbol_index.resolve_symbols(set_name, category)
+                except ValueError as e:
+                    self._respond(400, {'error': str(e)})
+                    return
+            else:
+                symbols_list = [s.strip() for s in symbols_str.split(',') if s.strip()]
 
-            if not symbols_str:
+            if not symbols_list:
                 self._respond(400, {'error': 'Missing symbols parameter'})
                 return
 
-            symbols_list = [s.strip() for s in symbols_str.split(',') if s.strip()]
             yahoo_list = [s.strip() for s in yahoo_symbols_str.split(',') if s.strip()]
             sources_list = [s.strip() for s in sources_str.split(',') if s.strip()]
 
-            # Build per-symbol maps
+            # Build per-symbol maps: explicit legacy lists win, then config routing
             yahoo_map = {}
             source_map = {}
             for i, sym in enumerate(symbols_list):
+                route = symbol_index.route_for(sym)
                 if i < len(yahoo_list) and yahoo_list[i]:
                     yahoo_map[sym] = yahoo_list[i]
+                elif route:
+                    yahoo_map[sym] = route.yahoo_symbol
                 if i < len(sources_list) and sources_list[i]:
                     source_map[sym] = sources_list[i]
+                elif route:
+                    source_map[sym] = route.source
 
-            result = {}
-            errors = []
-
-            # Pre-fetch goldprice data if any symbols need it (single API call)
-            goldprice_raw = None
-            goldprice_syms = [s for s in symbols_list if source_map.get(s) == 'goldprice']
-            if goldprice_syms:
-                try:
-                    goldprice_raw = fetch_goldprice_data()
-                except Exception as e:
-                    errors.append(f"goldprice API error: {str(e)}")
-
-            for sym in symbols_list:
-                source = source_map.get(sym, '')
-
-                # Try goldprice for precious metals
-                if source == 'goldprice' and goldprice_raw:
-                    try:
-                        data = parse_goldprice_symbol(goldprice_raw, sym)
-                        if data:
-                            result[sym] = data
-                            continue
-                    except Exception as e:
-                        errors.append(f"{sym}: goldprice parse error: {str(e)}")
-
-                # Try HKMA HIBOR for Hong Kong interbank offered rates
-                if source == 'hkma_hibor':
-                    try:
-                        data = fetch_hkma_hibor_latest(sym)
-                        if data:
-                            result[sym] = data
-                            continue
-                    except Exception as e:
-                        errors.append(f"{sym}: HKMA HIBOR error: {str(e)}")
-
-                # Try EODHD daily close for symbols without reliable real-time quotes
-                if source == 'eodhd_eod' and EODHD_API_KEY:
-                    try:
-                        data = fetch_eodhd_eod_latest(sym)
-                        if data:
-                            result[sym] = data
-                            continue
-                    except Exception as e:
-                        errors.append(f"{sym}: EODHD EOD error: {str(e)}")
-
-                # Try EODHD only for EODHD-backed or unspecified sources.
-                # Yahoo-configured futures (CL=F/BZ=F/HG=F) should not pay an
-                # EODHD 422 round trip before using their intended source.
-                if source not in ('eodhd_eod', 'yahoo') and EODHD_API_KEY:
-                    try:
-                        data = fetch_eodhd_realtime(sym)
-                        if data:
-                            result[sym] = data
-                            continue
-                    except Exception as e:
-                        errors.append(f"{sym}: EODHD error: {str(e)}")
-
-                # Fallback to Yahoo
-                yahoo_sym = yahoo_map.get(sym, sym)
+            spark_points = 0
+            if params.get('sparkline', [''])[0]:
                 try:
-                    data = fetch_yahoo_realtime(yahoo_sym)
-                    if data:
-                        result[sym] = data
-                        continue
-                except Exception as e:
-                    errors.append(f"{sym}: Yahoo fallback error ({yahoo_sym}): {str(e)}")
+                    spark_points = int(params['sparkline'][0])
+                except ValueError:
+                    spark_points = 0
+                if not 2 <= spark_points <= sparkline.MAX_POINTS:
+                    self._respond(400, {'error': f'sparkline must be 2-{sparkline.MAX_POINTS}'})
+                    return
+
+            if params.get('stream', [''])[0] in ('1', 'true'):
+                self._stream_quotes(symbols_list, source_map, yahoo_map)
+                return
+
+            spark_future = None
+            if spark_points:
+                spark_future = sparkline.load_async(spark_sessions(symbols_list, source_map, yahoo_map))
 
-                errors.append(f"{sym}: all sources failed")
+            # One deadline for the whole request: quotes first, then sparklines
+            result, errors = get_quotes(symbols_list, source_map, yahoo_map,
+                                        max(0, deadline - time.monotonic()))
+            if spark_future is not None:
+                result = attach_sparklines(result, yahoo_map, spark_future, spark_points,
+                                           max(0, deadline - time.monotonic()))
+            breakers = SOURCE_HEALTH.snapshot(symbols_list)
+            self.cache_control = cache_control(symbols_list, yahoo_map, errors)
 
             response = result
             if errors and not result:
                 response = {'error': 'all symbols failed', 'details': errors}
+                if breakers:
+                    response['_breakers'] = breakers
                 self._respond(502, response)
             else:
                 if errors:
                     response['_errors'] = errors
+                if breakers:
+                    response['_breakers'] = breakers
                 self._respond(200, response)
 
         except Exception as e:
@@ -408,16 +727,76 @@ class handler(BaseHTTPRequestHandler):
                 'trace': traceback.format_exc()
             })
 
+    def _stream_quotes(self, symbols_list, source_map, yahoo_map):
+        """Stream NDJSON: one line per symbol as its source chain resolves.
+
+        Lines are ``{"symbol", "data", "elapsed_ms"}``; the final line is a
+        summary with ``_errors``, ``_breakers``, per-symbol timings and, with
+        ``?debug=timing``, the upstream ``_timing`` breakdown. Uses
+        chunked transfer encoding so fast sources paint immediately.
+        """
+        started = time.monotonic()
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        self.send_response(200)
+        self._cors_headers()
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Cache-Control', DEFAULT_CACHE_CONTROL)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        errors = []
+        timings = {}
+        try:
+            for sym, data, sym_errors in iter_quotes(symbols_list, source_map, yahoo_map):
+                errors.extend(sym_errors)
+                if not data:
+                    continue
+                elapsed_ms = round((time.monotonic() - started) * 1000)
+                timings[sym] = elapsed_ms
+                self._write_chunk({'symbol': sym, 'data': data, 'elapsed_ms': elapsed_ms})
+        except Exception as e:
+            errors.append(f"stream error: {type(e).__name__}: {str(e)}")
+
+        summary = {
+            '_summary': True,
+            'resolved': len(timings),
+            'requested': len(dict.fromkeys(symbols_list)),
+            'total_ms': round((time.monotonic() - started) * 1000),
+            'timings_ms': timings,
+        }
+        if errors:
+            summary['_errors'] = errors
+        breakers = SOURCE_HEALTH.snapshot(symbols_list)
+        if breakers:
+            summary['_breakers'] = breakers
+        # Server-Timing cannot be sent after the headers, so with
+        # ?debug=timing the upstream breakdown rides on the summary line.
+        if self.debug_timing:
+            summary['_timing'] = dict(self.timings.to_json(), hedge=hedge.LATENCY.snapshot())
+        self._write_chunk(summary)
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _write_chunk(self, obj):
+        line = json.dumps(obj).encode() + b'\n'
+        self.wfile.write(f'{len(line):X}\r\n'.encode() + line + b'\r\n')
+        self.wfile.flush()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self._cors_headers()
         self.end_headers()
 
     def _respond(self, code, data):
+        if self.debug_timing and isinstance(data, dict):
+            data['_timing'] = dict(self.timings.to_json(), hedge=hedge.LATENCY.snapshot())
         self.send_response(code)
         self._cors_headers()
         self.send_header('Content-Type', 'application/json')
-        self.send_header('Cache-Control', 's-maxage=10, stale-while-revalidate=5')
+        self.send_header('Cache-Control', self.cache_control)
+        self.send_header('Server-Timing', self.timings.server_timing())
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
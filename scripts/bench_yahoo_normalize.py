@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Yahoo chart 归一化基准
+对比原先逐根 bar 的循环（带下标检查 + datetime.utcfromtimestamp().strftime）
+与 api/_yahoo.py 的 normalize_chart（按列 zip），并校验两者输出一致。
+
+用法: python scripts/bench_yahoo_normalize.py [重复次数]
+"""
+
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+import _yahoo as yahoo  # noqa: E402
+
+
+def legacy_normalize(result, date_strings=False):
+    """改动前 api/chart.py fetch_yahoo_chart 中的循环（原样保留作对照）"""
+    timestamps = result.get('timestamp') or []
+    quote = result.get('indicators', {}).get('quote', [{}])[0]
+    opens = quote.get('open', [])
+    highs = quote.get('high', [])
+    lows = quote.get('low', [])
+    closes = quote.get('close', [])
+    volumes = quote.get('volume', [])
+
+    ohlcv = []
+    for i in range(len(timestamps)):
+        if i < len(closes) and closes[i] is not None:
+            ts = timestamps[i]
+            if date_strings:
+                time_val = datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d')
+            else:
+                time_val = ts
+            ohlcv.append({
+                'time': time_val,
+                'open': opens[i] if i < len(opens) and opens[i] else closes[i],
+                'high': highs[i] if i < len(highs) and highs[i] else closes[i],
+                'low': lows[i] if i < len(lows) and lows[i] else closes[i],
+                'close': closes[i],
+                'volume': volumes[i] if i < len(volumes) and volumes[i] else 0
+            })
+    return ohlcv
+
+
+def synthetic_result(bars, step, start=1700000000, seed=7):
+    """构造 v8 chart result：随机游走价格，约 2% 的 bar 缺 close、1% 缺 open"""
+    rng = random.Random(seed)
+    price = 100.0
+    timestamps, opens, highs, lows, closes, volumes = [], [], [], [], [], []
+    for i in range(bars):
+        open_ = price
+        price *= 1 + rng.gauss(0, 0.01)
+        timestamps.append(start + i * step)
+        opens.append(None if rng.random() < 0.01 else open_)
+        highs.append(max(open_, price) * 1.002)
+        lows.append(min(open_, price) * 0.998)
+        closes.append(None if rng.random() < 0.02 else price)
+        volumes.append(rng.randint(0, 10 ** 6))
+    return {
+        'timestamp': timestamps,
+        'indicators': {'quote': [{
+            'open': opens, 'high': highs, 'low': lows, 'close': closes, 'volume': volumes,
+        }]},
+    }
+
+
+CASES = [
+    # (名称, bar 数, 间隔秒数, 是否转日期字符串)
+    ('2y daily', 504, 86400, True),
+    ('10y daily', 2520, 86400, True),
+    ('60d 5m', 60 * 78, 300, False),
+]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'case':<12} {'bars':>6} {'legacy ms':>10} {'column ms':>10} {'speedup':>8}")
+    for name, bars, step, date_strings in CASES:
+        result = synthetic_result(bars, step)
+        assert legacy_normalize(result, date_strings) == yahoo.normalize_chart(result, date_strings), name
+        legacy = timeit.timeit(lambda: legacy_normalize(result, date_strings), number=repeat) / repeat
+        column = timeit.timeit(lambda: yahoo.normalize_chart(result, date_strings), number=repeat) / repeat
+        print(f"{name:<12} {bars:>6} {legacy * 1000:>10.3f} {column * 1000:>10.3f} {legacy / column:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
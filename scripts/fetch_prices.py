@@ -9,10 +9,16 @@ import json
 import time
 import logging
 import os
-import re
-from datetime import datetime, timedelta
+import sys
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 
+# 交易日历、HIBOR 解析、EODHD 批量报价与 Vercel API 共用（api/_calendar.py、api/_hibor.py、api/quotes.py，仅依赖标准库）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+import _calendar as trading_calendar  # noqa: E402
+import _hibor as hibor  # noqa: E402
+import quotes as api_quotes  # noqa: E402
+
 # 检查并安装依赖
 try:
     import yfinance as yf
@@ -54,7 +60,16 @@ class MarketDataFetcher:
         self.config = self.load_config()
         self.timeout = 10
         self.max_retries = 3
+        # 共享 keep-alive 连接池：同一 host（eodhd.com / api.binance.com 等）的请求复用 TCP+TLS 连接
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
         self._goldprice_cache = None  # Cache goldprice API response within a run
+        self._eodhd_batch_cache = {}  # EODHD real-time rows from batched calls, keyed by symbol
+        self._hkma_records_cache = None  # HKMA HIBOR records shared by all tenors within a run
+        self._hkab_rates_cache = None  # HKAB (as_of_date, {maturity: rate}) within a run
+        # Previous run's output: closed markets carry these entries forward
+        self.previous_latest = self.load_previous('data/latest.json').get('assets', {})
+        self.previous_history = self.load_previous('data/history.json')
         
     def load_config(self) -> Dict:
         """加载配置文件"""
@@ -65,6 +80,38 @@ class MarketDataFetcher:
             logger.error(f"Failed to load config: {e}")
             raise
     
+    def load_previous(self, path: str) -> Dict:
+        """读取上一次输出的 JSON（不存在或损坏时返回空 dict）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def session_for(self, asset: Dict) -> Optional[str]:
+        """品种的交易时段（session 取 config，缺省按 symbol 后缀推断）"""
+        return asset.get('session') or trading_calendar.infer_session(asset['symbol'], asset.get('yahoo_symbol'))
+
+    def is_market_closed(self, asset: Dict) -> bool:
+        """品种所在市场当前是否休市"""
+        return not trading_calendar.is_open(self.session_for(asset))
+
+    def fetched_after_close(self, asset: Dict, entry: Dict) -> bool:
+        """上一次结果是否取自最近一个交易时段结束（含结算窗口）之后。
+
+        cron 可能延迟错过收盘后的结算窗口，收盘前取得的价格不能沿用，否则
+        收盘价整晚/整个周末都取不到。
+        """
+        bounds = trading_calendar.session_bounds(self.session_for(asset), datetime.now(timezone.utc))
+        if bounds is None:
+            return False
+        try:
+            # updated 为本地时间（无时区）的 ISO 字符串
+            updated = datetime.fromisoformat(entry['updated']).astimezone(timezone.utc)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return updated >= bounds[1]
+
     def get_yahoo_data(self, symbol: str, name: str) -> Dict[str, Any]:
         """获取 Yahoo Finance 数据"""
         result = {
@@ -149,13 +196,13 @@ class MarketDataFetcher:
         try:
             # 获取24小时价格统计
             ticker_url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={symbol}"
-            response = requests.get(ticker_url, timeout=self.timeout)
+            response = self.session.get(ticker_url, timeout=self.timeout)
             response.raise_for_status()
             ticker_data = response.json()
             
             # 获取K线历史数据（最近7天）
             klines_url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval=1d&limit=7"
-            klines_response = requests.get(klines_url, timeout=self.timeout)
+            klines_response = self.session.get(klines_url, timeout=self.timeout)
             klines_response.raise_for_status()
             klines_data = klines_response.json()
             
@@ -181,6 +228,26 @@ class MarketDataFetcher:
         
         return result
     
+    def prefetch_eodhd_realtime(self, symbols: List[str]) -> None:
+        """批量获取 EODHD 实时报价（real-time 接口的 s= 多 symbol 参数）
+
+        Rows are cached per symbol for get_eodhd_data; symbols the batch
+        does not return are fetched one by one there.
+        """
+        api_key = load_eodhd_api_key()
+        if not api_key or not symbols:
+            return
+
+        # 批大小与行匹配沿用 API 端（api/quotes.py），两边不会走样
+        for chunk in api_quotes.chunk_symbols(symbols):
+            try:
+                rows = api_quotes.fetch_eodhd_realtime_rows(chunk, api_key, timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"EODHD batch request failed for {','.join(chunk)}: {e}")
+                continue
+            self._eodhd_batch_cache.update(rows)
+            logger.info(f"EODHD batch: {len(rows)}/{len(chunk)} rows for {chunk[0]}..{chunk[-1]}")
+
     def get_eodhd_data(self, symbol: str, name: str, yahoo_symbol: str = None) -> Dict[str, Any]:
         """获取 EODHD 实时数据"""
         result = {
@@ -202,10 +269,13 @@ class MarketDataFetcher:
         
         for retry in range(self.max_retries):
             try:
-                url = f"https://eodhd.com/api/real-time/{symbol}?api_token={api_key}&fmt=json"
-                resp = requests.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
-                resp.raise_for_status()
-                data = resp.json()
+                # Use the batched row if we have one; retries always go per-symbol
+                data = self._eodhd_batch_cache.pop(symbol, None)
+                if data is None:
+                    url = f"https://eodhd.com/api/real-time/{symbol}?api_token={api_key}&fmt=json"
+                    resp = self.session.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
+                    resp.raise_for_status()
+                    data = resp.json()
                 
                 close_price = data.get('close')
                 prev_close = data.get('previousClose')
@@ -271,7 +341,7 @@ class MarketDataFetcher:
             try:
                 from_date = (datetime.utcnow() - timedelta(days=20)).strftime('%Y-%m-%d')
                 url = f"https://eodhd.com/api/eod/{symbol}?api_token={api_key}&fmt=json&from={from_date}"
-                resp = requests.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
+                resp = self.session.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
                 resp.raise_for_status()
                 raw = resp.json()
 
@@ -308,6 +378,38 @@ class MarketDataFetcher:
         return result
 
 
+    def load_hkma_hibor_records(self) -> List[Dict[str, Any]]:
+        """获取 HKMA HIBOR fixing 记录（一次下载，所有 tenor 共用）
+
+        HKMA returns every tenor in each daily record, so the page is fetched
+        once per run and cached. Records are sorted ascending by date; an empty
+        list means HKMA was unavailable.
+        """
+        if self._hkma_records_cache is not None:
+            return self._hkma_records_cache
+
+        url = (
+            'https://api.hkma.gov.hk/public/market-data-and-statistics/'
+            'monthly-statistical-bulletin/er-ir/hk-interbank-ir-daily'
+            '?segment=hibor.fixing&offset=0'
+        )
+        records = []
+        for retry in range(self.max_retries):
+            try:
+                resp = self.session.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
+                resp.raise_for_status()
+                raw = resp.json()
+                records = [r for r in raw.get('result', {}).get('records', []) if r.get('end_of_day')]
+                records = sorted(records, key=lambda r: r['end_of_day'])
+                break
+            except Exception as e:
+                logger.warning(f"HKMA HIBOR attempt {retry + 1} failed: {e}")
+                if retry < self.max_retries - 1:
+                    time.sleep(1)
+
+        self._hkma_records_cache = records
+        return records
+
     def get_hkma_hibor_data(self, symbol: str, name: str, tenor: str = 'ir_1m') -> Dict[str, Any]:
         """获取 HKMA HIBOR fixing daily data.
 
@@ -326,63 +428,62 @@ class MarketDataFetcher:
             'source': 'hkma_hibor'
         }
 
-        hkab_maturity_map = {
-            'ir_overnight': 'Overnight',
-            'ir_1w': '1 Week',
-            'ir_1m': '1 Month',
-            'ir_3m': '3 Months',
-            'ir_6m': '6 Months',
-            'ir_12m': '12 Months',
-        }
+        try:
+            records = [r for r in self.load_hkma_hibor_records() if r.get(tenor) not in (None, 'NA')]
+            if len(records) < 1:
+                raise ValueError(f"HKMA returned no usable HIBOR records for tenor {tenor}")
+
+            # If HKMA serves stale data, fall back to HKAB, the official fixing publisher.
+            latest = records[-1]
+            latest_date = datetime.strptime(latest.get('end_of_day'), '%Y-%m-%d').date()
+            if (datetime.utcnow().date() - latest_date).days > 7:
+                raise ValueError(f"HKMA returned stale HIBOR date {latest.get('end_of_day')}")
+            prev = records[-2] if len(records) >= 2 else None
+            latest_rate = float(latest[tenor])
+            prev_rate = float(prev[tenor]) if prev else latest_rate
+            change_percent = ((latest_rate - prev_rate) / prev_rate * 100) if prev_rate else 0
 
-        url = (
-            'https://api.hkma.gov.hk/public/market-data-and-statistics/'
-            'monthly-statistical-bulletin/er-ir/hk-interbank-ir-daily'
-            '?segment=hibor.fixing&offset=0'
-        )
+            result.update({
+                'price': latest_rate,
+                'change_percent_24h': change_percent,
+                'prev_close': prev_rate,
+                'history': [float(r[tenor]) for r in records[-7:]],
+                'last_updated': datetime.now().isoformat(),
+                'as_of_date': latest.get('end_of_day')
+            })
 
-        for retry in range(self.max_retries):
-            try:
-                resp = requests.get(url, timeout=self.timeout, headers={'User-Agent': 'MarketDashboard/1.0'})
-                resp.raise_for_status()
-                raw = resp.json()
-                records = raw.get('result', {}).get('records', [])
-                records = [r for r in records if r.get(tenor) not in (None, 'NA')]
-
-                if len(records) < 1:
-                    raise ValueError(f"HKMA returned no usable HIBOR records for tenor {tenor}")
-
-                # Sort ascending for history/sparkline. If HKMA serves stale data,
-                # fall back to HKAB, the official fixing publisher.
-                records = sorted(records, key=lambda r: r.get('end_of_day', ''))
-                latest = records[-1]
-                latest_date = datetime.strptime(latest.get('end_of_day'), '%Y-%m-%d').date()
-                if (datetime.utcnow().date() - latest_date).days > 7:
-                    raise ValueError(f"HKMA returned stale HIBOR date {latest.get('end_of_day')}")
-                prev = records[-2] if len(records) >= 2 else None
-                latest_rate = float(latest[tenor])
-                prev_rate = float(prev[tenor]) if prev else latest_rate
-                change_percent = ((latest_rate - prev_rate) / prev_rate * 100) if prev_rate else 0
+            logger.info(f"✓ {name} ({symbol}): {latest_rate:.5f}% ({change_percent:+.2f}%) [hkma_hibor {latest.get('end_of_day')}]")
+            return result
 
-                result.update({
-                    'price': latest_rate,
-                    'change_percent_24h': change_percent,
-                    'prev_close': prev_rate,
-                    'history': [float(r[tenor]) for r in records[-7:]],
-                    'last_updated': datetime.now().isoformat(),
-                    'as_of_date': latest.get('end_of_day')
-                })
+        except Exception as e:
+            logger.warning(f"HKMA HIBOR unavailable for {symbol}: {e}")
 
-                logger.info(f"✓ {name} ({symbol}): {latest_rate:.5f}% ({change_percent:+.2f}%) [hkma_hibor {latest.get('end_of_day')}]")
-                return result
+        logger.warning(f"Falling back to HKAB HIBOR page for {symbol}")
+        return self.get_hkab_hibor_data(symbol, name, hibor.HKAB_MATURITY_MAP.get(tenor, '1 Month'))
 
-            except Exception as e:
-                logger.warning(f"HKMA HIBOR attempt {retry + 1} failed for {symbol}: {e}")
-                if retry < self.max_retries - 1:
-                    time.sleep(1)
+    def load_hkab_hibor_rates(self) -> tuple[Optional[str], Dict[str, float]]:
+        """获取 HKAB 官方 HIBOR 页面（一次下载，解析全部期限）
 
-        logger.warning(f"Falling back to HKAB HIBOR page for {symbol}")
-        return self.get_hkab_hibor_data(symbol, name, hkab_maturity_map.get(tenor, '1 Month'))
+        Returns (as_of_date, {maturity: rate}); the page is fetched at most
+        once per run.
+        """
+        if self._hkab_rates_cache is not None:
+            return self._hkab_rates_cache
+
+        try:
+            resp = self.session.get(
+                hibor.HKAB_HIBOR_URL,
+                timeout=self.timeout,
+                headers={'User-Agent': 'Mozilla/5.0 MarketDashboard/1.0', 'Accept-Language': 'en-US,en;q=0.9'}
+            )
+            resp.raise_for_status()
+        except Exception:
+            # Don't re-download a failing page for every remaining tenor
+            self._hkab_rates_cache = (None, {})
+            raise
+        # Same parser as the API's HKAB fallback (api/_hibor.py)
+        self._hkab_rates_cache = hibor.parse_hkab_rates(resp.text)
+        return self._hkab_rates_cache
 
     def get_hkab_hibor_data(self, symbol: str, name: str, maturity: str = '1 Month') -> Dict[str, Any]:
         """Fetch latest HIBOR fixing from HKAB's official rates page."""
@@ -397,26 +498,10 @@ class MarketDataFetcher:
             'source': 'hkab_hibor'
         }
         try:
-            resp = requests.get(
-                'https://www.hkab.org.hk/en/rates/hibor',
-                timeout=self.timeout,
-                headers={'User-Agent': 'Mozilla/5.0 MarketDashboard/1.0', 'Accept-Language': 'en-US,en;q=0.9'}
-            )
-            resp.raise_for_status()
-            html = resp.text
-            date_match = re.search(r'Rates as at 11:15a\.m\.<br/>Hong Kong Time on (\d{4})-(\d{1,2})-(\d{1,2})\.', html)
-            as_of_date = None
-            if date_match:
-                y, m, d = map(int, date_match.groups())
-                as_of_date = f'{y:04d}-{m:02d}-{d:02d}'
-            pattern = (
-                r'<div class="general_table_cell hibor_maturity"><div>' + re.escape(maturity) +
-                r'</div></div><div class="general_table_cell last"><div>([0-9.]+)</div></div>'
-            )
-            rate_match = re.search(pattern, html)
-            if not rate_match:
+            as_of_date, rates = self.load_hkab_hibor_rates()
+            if maturity not in rates:
                 raise ValueError(f'HKAB HIBOR rate not found for {maturity}')
-            latest_rate = float(rate_match.group(1))
+            latest_rate = rates[maturity]
             result.update({
                 'price': latest_rate,
                 'change_percent_24h': 0,
@@ -449,7 +534,7 @@ class MarketDataFetcher:
         if self._goldprice_cache is None:
             for retry in range(self.max_retries):
                 try:
-                    resp = requests.get(
+                    resp = self.session.get(
                         'https://data-asg.goldprice.org/dbXRates/USD',
                         timeout=self.timeout,
                         headers={'User-Agent': 'MarketDashboard/1.0'}
@@ -529,12 +614,41 @@ class MarketDataFetcher:
         meta = {
             'total_assets': 0,
             'successful_fetches': 0,
-            'failed_fetches': 0
+            'failed_fetches': 0,
+            'carried_forward': 0
         }
-        
+
+        # 休市品种的价格不会变化：上一次成功结果取自收盘之后则沿用，不请求上游
+        closed = {
+            asset['symbol']
+            for category in self.config['categories']
+            for asset in category['assets']
+            if self.is_market_closed(asset)
+            and asset['symbol'] in self.previous_latest
+            and not self.previous_latest[asset['symbol']].get('error')
+            and self.fetched_after_close(asset, self.previous_latest[asset['symbol']])
+        }
+
+        # One batched EODHD real-time pass for every eodhd-routed asset
+        self.prefetch_eodhd_realtime([
+            asset['symbol']
+            for category in self.config['categories']
+            for asset in category['assets']
+            if asset['source'] == 'eodhd' and asset['symbol'] not in closed
+        ])
+
         for category in self.config['categories']:
             for asset in category['assets']:
                 symbol = asset['symbol']
+                if symbol in closed:
+                    logger.info(f"Market closed for {asset['name']} ({symbol}), keeping previous data")
+                    latest_data['assets'][symbol] = self.previous_latest[symbol]
+                    if symbol in self.previous_history:
+                        history_data[symbol] = self.previous_history[symbol]
+                    meta['carried_forward'] += 1
+                    meta['total_assets'] += 1
+                    continue
+
                 logger.info(f"Fetching data for {asset['name']} ({symbol})...")
                 
                 if asset['source'] == 'goldprice':
@@ -544,7 +658,7 @@ class MarketDataFetcher:
                 elif asset['source'] == 'eodhd_eod':
                     data = self.get_eodhd_eod_data(symbol, asset['name'])
                 elif asset['source'] == 'hkma_hibor':
-                    data = self.get_hkma_hibor_data(symbol, asset['name'], asset.get('tenor', 'ir_1m'))
+                    data = self.get_hkma_hibor_data(symbol, asset['name'], hibor.tenor_for(symbol))
                 elif asset['source'] == 'yahoo':
                     data = self.get_yahoo_data(symbol, asset['name'])
                 elif asset['source'] == 'binance':
@@ -664,7 +778,7 @@ def test_single_asset(symbol: str):
         elif asset_config['source'] == 'eodhd_eod':
             data = fetcher.get_eodhd_eod_data(symbol, asset_config['name'])
         elif asset_config['source'] == 'hkma_hibor':
-            data = fetcher.get_hkma_hibor_data(symbol, asset_config['name'], asset_config.get('tenor', 'ir_1m'))
+            data = fetcher.get_hkma_hibor_data(symbol, asset_config['name'], hibor.tenor_for(symbol))
         elif asset_config['source'] == 'yahoo':
             data = fetcher.get_yahoo_data(symbol, asset_config['name'])
         elif asset_config['source'] == 'binance':
@@ -703,7 +817,9 @@ def main():
         
         # 打印摘要
         meta = latest_data['meta']
-        logger.info(f"Fetch completed: {meta['successful_fetches']}/{meta['total_assets']} successful")
+        fetched = meta['total_assets'] - meta['carried_forward']
+        logger.info(f"Fetch completed: {meta['successful_fetches']}/{fetched} successful, "
+                    f"{meta['carried_forward']} carried forward (market closed)")
         
         if meta['failed_fetches'] > 0:
             logger.warning(f"{meta['failed_fetches']} assets failed to fetch")